@@ -0,0 +1,27 @@
+import json
+import os
+
+# --- OPCJE DODATKU (/data/options.json, schemat w config.yaml) ---
+
+# DATA_DIR pozwala uruchomić dodatek poza kontenerem (np. tools/bench.py)
+DATA_DIR = os.environ.get("DATA_DIR", "/data")
+OPTIONS_FILE = os.path.join(DATA_DIR, "options.json")
+
+_cache = {"mtime": None, "data": {}}
+
+
+def load_options():
+    # Czytamy ponownie tylko gdy plik się zmienił
+    try: mtime = os.path.getmtime(OPTIONS_FILE)
+    except OSError: return {}
+    if mtime != _cache["mtime"]:
+        try:
+            with open(OPTIONS_FILE, 'r') as f: _cache["data"] = json.load(f)
+        except: _cache["data"] = {}
+        _cache["mtime"] = mtime
+    return _cache["data"]
+
+
+def get_option(key, default=None):
+    value = load_options().get(key)
+    return default if value is None else value
@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import metrics
+
+try:
+    import aiohttp
+except ImportError:  # silnik asyncio jest opcjonalny; bez aiohttp zostaje pętla wątkowa
+    aiohttp = None
+
+# --- SILNIK ASYNCIO (opcja engine: asyncio) ---
+# Alternatywa dla sekwencyjnej pętli wątkowej. Odczyty sensorów z harmonogramu idą
+# równolegle (fetch_states), a potem wszyscy pracownicy do oceny startują naraz jako
+# korutyny: ocena -> publikacja, więc zapisy kopii sensorów jednego pracownika lecą,
+# gdy inni są jeszcze oceniani. Semafor ogranicza liczbę równoczesnych zapytań do HA,
+# a termin ticku przerywa maruderów - ich ocena przechodzi na następny tick zamiast
+# opóźniać wszystkich.
+
+READ_TIMEOUT = 5
+
+
+class AsyncEngine:
+    def __init__(self, api_url, headers, evaluate, concurrency=16, deadline=8, log=print):
+        if aiohttp is None: raise RuntimeError("Silnik asyncio wymaga pakietu aiohttp")
+        self.api_url = api_url
+        self.headers = {k: v for k, v in headers.items() if k != "Content-Type"}
+        self.evaluate = evaluate  # callable(emp, lookup) -> wynik oceny (evaluate_employee)
+        self.concurrency = concurrency
+        self.deadline = deadline
+        self.log = log
+        self.loop = asyncio.new_event_loop()
+        self._session = None
+        self._sem = None
+        self._deadline_at = None
+        self._sent = self._failed = 0
+        self.stats = {"requests": 0, "errors": 0, "stragglers": 0}
+
+    # --- API DLA PĘTLI LOGIKI (wywołania synchroniczne) ---
+    def begin_tick(self):
+        self._deadline_at = time.monotonic() + self.deadline
+        self._sent = self._failed = 0
+
+    def fetch_states(self, entity_ids):
+        # entity_id -> stan albo None (404); encje z błędem połączenia pomijane
+        return self.loop.run_until_complete(self._fetch_states(entity_ids))
+
+    def evaluate_all(self, emps, states_index, on_result, publisher):
+        # Zwraca imiona pracowników, którzy nie zdążyli przed terminem (ocena albo publikacja)
+        return self.loop.run_until_complete(self._evaluate_all(emps, states_index, on_result, publisher))
+
+    def flush(self, publisher):
+        self.loop.run_until_complete(self._flush(publisher))
+        publisher.last_stats = {"sent": self._sent, "skipped": publisher.take_skipped(), "failed": self._failed}
+        return publisher.last_stats
+
+    # --- HTTP ---
+    def _remaining(self):
+        if self._deadline_at is None: return self.deadline
+        return self._deadline_at - time.monotonic()
+
+    async def _ensure_session(self):
+        if self._session is not None and not self._session.closed: return
+        self._sem = asyncio.Semaphore(self.concurrency)
+        self._session = aiohttp.ClientSession(
+            headers=self.headers, connector=aiohttp.TCPConnector(limit=self.concurrency))
+
+    async def _request(self, method, path, **kwargs):
+        async with self._sem:
+            remaining = self._remaining()
+            if remaining <= 0: raise asyncio.TimeoutError()
+            self.stats["requests"] += 1
+            timeout = aiohttp.ClientTimeout(total=min(READ_TIMEOUT, remaining))
+            started = time.perf_counter()
+            try:
+                async with self._session.request(method, f"{self.api_url}{path}", timeout=timeout, **kwargs) as resp:
+                    body = await resp.json(content_type=None) if method == "GET" and resp.status == 200 else None
+                    metrics.observe_ha(method, path, resp.status, time.perf_counter() - started)
+                    return resp.status, body
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+                self.stats["errors"] += 1
+                metrics.observe_ha(method, path, "timeout" if isinstance(e, asyncio.TimeoutError) else "error",
+                                   time.perf_counter() - started)
+                raise
+
+    async def _fetch_state(self, entity_id, results):
+        try: status, body = await self._request("GET", f"/states/{entity_id}")
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError): return
+        if status == 200: results[entity_id] = body
+        elif status == 404: results[entity_id] = None
+
+    async def _fetch_states(self, entity_ids):
+        await self._ensure_session()
+        results = {}
+        await asyncio.gather(*(self._fetch_state(eid, results) for eid in entity_ids))
+        return results
+
+    # --- ETAPY: ODCZYT -> OCENA -> PUBLIKACJA ---
+
+    async def _post(self, entity_id, payload, results):
+        try:
+            status, _ = await self._request("POST", f"/states/{entity_id}", json=payload)
+            results[entity_id] = status in (200, 201)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+            results[entity_id] = False
+
+    async def _publish(self, publisher):
+        pending = publisher.take_pending()
+        if not pending: return
+        results = {}
+        try:
+            await asyncio.gather(*(self._post(eid, payload, results) for eid, (payload, key) in pending.items()))
+        finally:
+            # Także po przerwaniu terminem: niewysłane zapisy wracają do ponowienia
+            sent, failed = publisher.settle(pending, results)
+            self._sent += sent
+            self._failed += failed
+
+    async def _employee(self, emp, states_index, on_result, publisher):
+        on_result(self.evaluate(emp, states_index.get))
+        await self._publish(publisher)
+
+    async def _evaluate_all(self, emps, states_index, on_result, publisher):
+        if not emps: return []
+        await self._ensure_session()
+        tasks = {asyncio.ensure_future(self._employee(emp, states_index, on_result, publisher)): emp for emp in emps}
+        done, late = await asyncio.wait(tasks, timeout=max(0, self._remaining()))
+        for task in late: task.cancel()
+        if late: await asyncio.gather(*late, return_exceptions=True)
+        for task in done:
+            if task.exception(): self.log(f"[ASYNC] Błąd oceny {tasks[task]['name']}: {task.exception()}")
+        self.stats["stragglers"] += len(late)
+        return [tasks[task]['name'].strip() for task in late]
+
+    async def _flush(self, publisher):
+        await self._ensure_session()
+        try: await asyncio.wait_for(self._publish(publisher), timeout=max(0.001, self._remaining()))
+        except asyncio.TimeoutError: pass
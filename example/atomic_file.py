@@ -0,0 +1,41 @@
+import fcntl
+import os
+import tempfile
+from contextlib import contextmanager
+
+# --- PLIKI WSPÓŁDZIELONE PRZEZ PROCES LOGIKI I SERWER WWW ---
+# Zapis: plik tymczasowy w tym samym katalogu + rename, więc czytelnik widzi starą albo nową
+# treść, nigdy połowę. Zmiany typu odczyt-modyfikacja-zapis idą pod flock na osobnym pliku
+# .lock (wspólnym dla procesów). Odczyt po zmianie rozpoznajemy po sygnaturze z os.stat().
+
+
+def atomic_write(path, data, fsync=False):
+    # data: bytes; fsync=True dla plików w /data, które mają przetrwać utratę zasilania
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", prefix="." + os.path.basename(path) + ".")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.chmod(tmp, 0o644)  # mkstemp tworzy 0600
+        os.replace(tmp, path)
+    except BaseException:
+        try: os.unlink(tmp)
+        except OSError: pass
+        raise
+
+
+@contextmanager
+def file_lock(lock_path):
+    with open(lock_path, 'a') as lf:
+        fcntl.flock(lf, fcntl.LOCK_EX)
+        try: yield
+        finally: fcntl.flock(lf, fcntl.LOCK_UN)
+
+
+def file_signature(path):
+    # None - pliku nie ma; inny inode oznacza podmianę przez rename
+    try: st = os.stat(path)
+    except OSError: return None
+    return (st.st_mtime_ns, st.st_size, st.st_ino)
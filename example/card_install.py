@@ -0,0 +1,52 @@
+import hashlib
+import os
+
+from atomic_file import atomic_write
+
+# --- INSTALACJA KARTY LOVELACE (/config/www/employee-card.js) ---
+# Plik karty kopiujemy tylko wtedy, gdy jego treść (sha256) różni się od już
+# zainstalowanej - zwykły restart dodatku nie zapisuje niczego na karcie SD
+# i nie zmienia mtime pliku serwowanego przez HA. Zasób Lovelace ma w adresie odcisk
+# treści (?v=<sha256>), więc przeglądarki mogą trzymać kartę w cache bez końca,
+# a nowa wersja dodatku zmienia adres i wymusza pobranie.
+
+
+def file_digest(path):
+    # sha256 treści pliku albo None, jeśli pliku nie ma
+    h = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(64 * 1024), b""): h.update(chunk)
+    except OSError:
+        return None
+    return h.hexdigest()
+
+
+def sync_card_file(source, dest):
+    # True - skopiowano nową wersję, False - w miejscu docelowym jest już ta sama treść
+    if file_digest(source) == file_digest(dest): return False
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    with open(source, 'rb') as f: atomic_write(dest, f.read())
+    return True
+
+
+def card_resource_url(base_url, source):
+    # /local/employee-card.js?v=<12 znaków sha256> - ten sam odcisk co ETag przy serwowaniu karty
+    digest = file_digest(source)
+    return f"{base_url}?v={digest[:12]}" if digest else base_url
+
+
+def register_card_resource(ha, url):
+    # Zwraca "exists", "updated" (podmieniony odcisk w adresie) albo "created"; RuntimeError przy błędzie API
+    base = url.split("?", 1)[0]
+    res = ha.request("GET", "/lovelace/resources")
+    if res.status_code == 200:
+        for item in res.json():
+            if item.get('url') == url: return "exists"
+            if str(item.get('url', '')).split("?", 1)[0] == base and 'id' in item:
+                upd = ha.request("POST", f"/lovelace/resources/{item['id']}", json={"type": "module", "url": url})
+                if upd.status_code in (200, 201): return "updated"
+                raise RuntimeError(f"Błąd API HA ({upd.status_code})")
+    res = ha.request("POST", "/lovelace/resources", json={"type": "module", "url": url})
+    if res.status_code in (200, 201): return "created"
+    raise RuntimeError(f"Błąd API HA ({res.status_code})")
@@ -0,0 +1,85 @@
+import json
+import threading
+import time
+
+from atomic_file import atomic_write
+
+# --- CHECKPOINT LICZNIKÓW (status.json + dziennik) ---
+# Zamiast przepisywać cały status.json co tick, dopisujemy do dziennika jedną zwięzłą
+# linię z licznikami, które zmieniły się od ostatniego zapisu (nie częściej niż co
+# write_interval s). Co compact_every linii dziennik jest scalany z status.json
+# (zapis atomowy) i czyszczony. Przy starcie load() odtwarza stan: status.json + dziennik.
+# Odtworzone liczniki są dolną granicą dzisiejszych minut w bazie historii (restore_day),
+# więc dziennik pokrywa też zapisy do SQLite, które nie doszły przed awarią.
+
+
+class StatusCheckpoint:
+    def __init__(self, status_file, write_interval=60, compact_every=100):
+        self.status_file = status_file
+        self.journal_file = status_file + ".journal"
+        self.write_interval = write_interval
+        self.compact_every = compact_every
+        self._state = None
+        self._written = {}
+        self._written_date = None
+        self._last_write = 0.0
+        self._lines = 0
+        self._lock = threading.Lock()
+
+    def load(self, today):
+        state = {"date": today, "counters": {}}
+        try:
+            with open(self.status_file, 'r') as f: state = json.load(f)
+        except (OSError, ValueError): pass
+        lines = 0
+        try:
+            with open(self.journal_file, 'r') as f:
+                for line in f:
+                    try: entry = json.loads(line)
+                    except ValueError: break  # urwana ostatnia linia po awarii
+                    if entry.get("d") != state.get("date"): state = {"date": entry.get("d"), "counters": {}}
+                    state["counters"].update(entry.get("c", {}))
+                    lines += 1
+        except OSError: pass
+        with self._lock:
+            self._state = state
+            self._written = dict(state.get("counters", {}))
+            self._written_date = state.get("date")
+            self._lines = lines
+        return {"date": state.get("date"), "counters": dict(state.get("counters", {}))}
+
+    def update(self, status_data, force=False):
+        with self._lock:
+            self._state = {"date": status_data["date"], "counters": dict(status_data.get("counters", {}))}
+            if not force and time.time() - self._last_write < self.write_interval: return
+            self._append()
+
+    def flush(self):
+        # Wywoływane przy wyłączaniu (SIGTERM) - zapisuje wszystko i scala dziennik
+        with self._lock:
+            if self._state is None: return
+            self._append()
+            self._compact()
+
+    def _append(self):
+        counters = self._state["counters"]
+        date_changed = self._state["date"] != self._written_date
+        delta = {k: round(v, 3) for k, v in counters.items() if date_changed or self._written.get(k) != round(v, 3)}
+        self._last_write = time.time()
+        if not delta and not date_changed: return
+        with open(self.journal_file, 'a') as f:
+            f.write(json.dumps({"d": self._state["date"], "c": delta}, separators=(",", ":")) + "\n")
+        if date_changed: self._written = {}
+        self._written.update(delta)
+        self._written_date = self._state["date"]
+        self._lines += 1
+        if self._lines >= self.compact_every: self._compact()
+
+    def _compact(self):
+        try: atomic_write(self.status_file, json.dumps(self._state, separators=(",", ":")).encode("utf-8"), fsync=True)
+        except OSError: return
+        # Dopiero po udanym rename - dziennik jest już w status.json
+        open(self.journal_file, 'w').close()
+        self._written = {k: round(v, 3) for k, v in self._state["counters"].items()}
+        self._written_date = self._state["date"]
+        self._lines = 0
@@ -0,0 +1,99 @@
+from collections import namedtuple
+
+import metrics
+
+# --- WYKRYWANIE STANU PRACOWNIKA (histereza + minimalny czas trwania) ---
+# Moc w okolicy progu nie przełącza już statusu co tick: "Pracuje" włącza się powyżej
+# `threshold`, a wyłącza dopiero poniżej `threshold_off`. Nowy stan musi się utrzymać
+# przez `min_on` / `min_off` sekund, zanim trafi do HA. Między progiem obecności
+# a progiem wyłączenia pracownik jest "Obecny" (komputer włączony, bez pracy).
+# Reguły są kompilowane raz na zmianę listy pracowników (wersja rejestru), a nie przy
+# każdej ocenie.
+
+WORKING, IDLE, ABSENT = "Pracuje", "Obecny", "Nieobecny"
+ICONS = {WORKING: "mdi:laptop", IDLE: "mdi:coffee", ABSENT: "mdi:account-off"}
+
+DEFAULT_THRESHOLD = 20.0  # W: próg włączenia (pole threshold)
+DEFAULT_OFF_RATIO = 0.75  # threshold_off domyślnie 75% progu włączenia
+DEFAULT_IDLE = 5.0        # W: poniżej - "Nieobecny", od tej wartości do threshold_off - "Obecny"
+DEFAULT_MIN_ON = 30       # sekundy, zanim "Pracuje" zostanie uznane
+DEFAULT_MIN_OFF = 120     # sekundy, zanim zejście z "Pracuje" (i każda inna zmiana) zostanie uznane
+
+Rule = namedtuple("Rule", "on off idle min_on min_off")
+
+
+def _number(emp, key, default):
+    try: return float(emp.get(key))
+    except (TypeError, ValueError): return default
+
+
+def compile_rule(emp):
+    on = _number(emp, 'threshold', DEFAULT_THRESHOLD)
+    off = min(on, _number(emp, 'threshold_off', on * DEFAULT_OFF_RATIO))
+    idle = min(off, _number(emp, 'threshold_idle', DEFAULT_IDLE))
+    return Rule(on, off, idle, max(0.0, _number(emp, 'min_on', DEFAULT_MIN_ON)),
+                max(0.0, _number(emp, 'min_off', DEFAULT_MIN_OFF)))
+
+
+def raw_state(rule, current, power, active):
+    # Stan wynikający z bieżącego odczytu; strefa między off a on zachowuje "Pracuje"
+    if active or (power is not None and power >= rule.on): return WORKING
+    if power is None: return ABSENT
+    if current == WORKING and power > rule.off: return WORKING
+    return IDLE if power >= rule.idle else ABSENT
+
+
+class Detector:
+    def __init__(self):
+        self._version = None
+        self._rules = {}
+        self._state = {}        # nazwa -> [stan, kandydat, od kiedy kandydat]
+        self._entered = {}      # nazwa -> chwila wejścia w bieżący stan (z opóźnieniem min_on/min_off wstecz)
+        self.transitions = {}   # nazwa -> liczba zmian statusu dzisiaj
+        self.suppressed = 0     # wahania odrzucone dzisiaj (kandydat nie utrzymał się przez min_on/min_off)
+
+    def compile(self, emps, version):
+        if version == self._version: return False
+        self._rules = {emp['name'].strip(): compile_rule(emp) for emp in emps}
+        for name in list(self._state):
+            if name not in self._rules:
+                del self._state[name]
+                self._entered.pop(name, None)
+        self._version = version
+        return True
+
+    def update(self, name, power, active, now):
+        # power: najwyższa moc w W z sensorów pracownika (None = brak), active: binary_sensor "on"
+        rule = self._rules.get(name) or compile_rule({})
+        st = self._state.get(name)
+        if st is None:
+            # Po starcie przyjmujemy bieżący stan od razu - bez zmiany nie ma czego tłumić
+            state = raw_state(rule, None, power, active)
+            self._state[name] = [state, state, now]
+            self._entered[name] = now
+            return state
+        state, candidate, since = st
+        raw = raw_state(rule, state, power, active)
+        if raw == state:
+            if candidate != state:
+                self.suppressed += 1
+                metrics.STATUS_FLAPS_SUPPRESSED.inc()
+                st[1] = state
+            return state
+        if raw != candidate: st[1], st[2] = raw, now
+        if now - st[2] < (rule.min_on if raw == WORKING else rule.min_off): return state
+        # Stan uznany: liczymy go od chwili, w której się pojawił, a nie od końca odczekiwania
+        st[0] = raw
+        self._entered[name] = st[2]
+        self.transitions[name] = self.transitions.get(name, 0) + 1
+        metrics.STATUS_TRANSITIONS.labels(raw).inc()
+        return raw
+
+    def entered(self, name, default):
+        return self._entered.get(name, default)
+
+    def take_day(self):
+        # Dzienne podsumowanie (przy zmianie dnia): ({nazwa: liczba zmian}, odrzucone wahania)
+        out = (self.transitions, self.suppressed)
+        self.transitions, self.suppressed = {}, 0
+        return out
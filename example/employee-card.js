@@ -10,6 +10,68 @@ const KNOWN_SENSOR_TYPES = [
   { suffix: 'pm25_density', icon: 'mdi:blur', unit: 'ug/m3' }
 ];
 
+// --- WYKRESY (szeregi z /api/series dodatku, przez ingress) ---
+// Karta działa w interfejsie HA, więc do API dodatku idzie przez ingress Supervisora:
+// adres z /addons/<slug>/info i sesja ingress (tak jak panel boczny; wymaga konta administratora).
+// Bez dostępu karta po prostu nie pokazuje wykresów.
+const ADDON_SLUG_SUFFIX = 'employee_manager_v2';
+const SERIES_REFRESH_MS = 5 * 60 * 1000;
+const SERIES_POINTS = 48;
+const seriesCache = new Map();  // imię -> { at, sensors: { entity_id: values } }
+let ingressBase = null;         // Promise -> adres ingress dodatku albo null
+
+function getIngressBase(hass) {
+  if (!ingressBase) {
+    ingressBase = (async () => {
+      try {
+        const list = await hass.callWS({ type: 'supervisor/api', endpoint: '/addons', method: 'get' });
+        const addon = (list.addons || []).find(a => a.slug.endsWith(ADDON_SLUG_SUFFIX));
+        if (!addon) return null;
+        const info = await hass.callWS({ type: 'supervisor/api', endpoint: `/addons/${addon.slug}/info`, method: 'get' });
+        return info.ingress_url || null;
+      } catch (e) { return null; }
+    })();
+  }
+  return ingressBase;
+}
+
+async function openIngressSession(hass) {
+  const res = await hass.callWS({ type: 'supervisor/api', endpoint: '/ingress/session', method: 'post' });
+  document.cookie = `ingress_session=${res.session};path=/api/hassio_ingress/;SameSite=Strict${location.protocol === 'https:' ? ';Secure' : ''}`;
+}
+
+function requestSeries(hass, name, onUpdate) {
+  const cached = seriesCache.get(name);
+  if (cached && (cached.pending || Date.now() - cached.at < SERIES_REFRESH_MS)) return;
+  seriesCache.set(name, { ...(cached || { sensors: {} }), pending: true });
+  (async () => {
+    const entry = { at: Date.now(), sensors: (cached || {}).sensors || {} };
+    try {
+      const base = await getIngressBase(hass);
+      if (base) {
+        await openIngressSession(hass);
+        const res = await fetch(`${base}api/series/${encodeURIComponent(name)}?range=24h&points=${SERIES_POINTS}`, { credentials: 'same-origin' });
+        if (res.ok) {
+          entry.sensors = {};
+          (await res.json()).sensors.forEach(s => { entry.sensors[s.entity_id] = s.values; });
+        }
+      }
+    } catch (e) { /* zostają poprzednie dane */ }
+    seriesCache.set(name, entry);
+    onUpdate();
+  })();
+}
+
+function sparkline(values) {
+  const pts = (values || []).map((v, i) => [i, v]).filter(p => p[1] !== null);
+  if (pts.length < 2) return '';
+  const vals = pts.map(p => p[1]);
+  const min = Math.min(...vals), span = (Math.max(...vals) - min) || 1;
+  const last = values.length - 1 || 1;
+  const line = pts.map(([i, v]) => `${(i / last * 60).toFixed(1)},${(16 - (v - min) / span * 14).toFixed(1)}`).join(' ');
+  return `<svg class="spark" viewBox="0 0 60 18" preserveAspectRatio="none"><polyline points="${line}" /></svg>`;
+}
+
 const SHARED_STYLES = `
   .emp-card { 
     background: var(--ha-card-background, white); 
@@ -52,6 +114,8 @@ const SHARED_STYLES = `
   .progress-container { width: 100%; height: 6px; background-color: #f0f0f0; border-radius: 3px; margin-bottom: 12px; overflow: hidden; }
   .progress-bar { height: 100%; background-color: #4CAF50; border-radius: 3px; transition: width 0.5s ease-in-out; }
   .progress-bar.over { background-color: #9C27B0; }
+  .week-row { display: flex; justify-content: space-between; font-size: 0.75rem; color: var(--secondary-text-color); font-weight: 700; text-transform: uppercase; margin-bottom: 4px; }
+  .progress-bar.week { background-color: #2196F3; }
 
   .sensors-row { display: flex; flex-wrap: wrap; gap: 8px; padding-top: 12px; border-top: 1px solid var(--divider-color, #eee); }
   .sensor-chip { 
@@ -64,15 +128,19 @@ const SHARED_STYLES = `
     box-shadow: 0 1px 2px rgba(0,0,0,0.05);
   }
   .sensor-chip ha-icon { --mdc-icon-size: 18px; margin-right: 6px; color: var(--secondary-text-color); }
+  .sensor-chip .spark { width: 48px; height: 16px; margin-left: 8px; }
+  .sensor-chip .spark polyline { fill: none; stroke: var(--primary-color, #03a9f4); stroke-width: 1.5; vector-effect: non-scaling-stroke; }
 `;
 
-function renderEmployeeHTML(hass, entityId) {
+function renderEmployeeHTML(hass, entityId, onSeries) {
   const statusEntity = hass.states[entityId];
   if (!statusEntity) return '';
 
   const fullName = statusEntity.attributes.friendly_name.replace(' - Status', '');
   const baseId = entityId.replace('_status', '');
   const state = statusEntity.state;
+  if (onSeries) requestSeries(hass, fullName, onSeries);
+  const series = (seriesCache.get(fullName) || {}).sensors || {};
 
   let statusClass = 'is-absent', iconName = 'mdi:account-off';
   if (state === 'Pracuje') { statusClass = 'is-working'; iconName = 'mdi:laptop'; }
@@ -86,6 +154,18 @@ function renderEmployeeHTML(hass, entityId) {
   let progressClass = "";
   if (progressPct > 100) { progressPct = 100; progressClass = "over"; }
 
+  // Suma tygodnia (pn-nd) z sensora _czas_tydzien; cel: 5 dni po 8 h
+  const weekEntity = hass.states[`${baseId}_czas_tydzien`];
+  const weekTarget = targetMinutes * 5;
+  let weekHtml = '';
+  if (weekEntity && !isNaN(parseFloat(weekEntity.state))) {
+    const weekVal = parseFloat(weekEntity.state);
+    const weekPct = Math.min(100, (weekVal / weekTarget) * 100);
+    weekHtml = `
+      <div class="week-row"><span>Tydzień</span><span>${(weekVal / 60).toFixed(1)} / ${weekTarget / 60} h</span></div>
+      <div class="progress-container" title="Cel tygodniowy: ${weekTarget / 60}h"><div class="progress-bar week ${weekVal > weekTarget ? 'over' : ''}" style="width: ${weekPct}%"></div></div>`;
+  }
+
   let sensorsHtml = '';
   KNOWN_SENSOR_TYPES.forEach(type => {
     const sId = `${baseId}_${type.suffix}`;
@@ -96,6 +176,7 @@ function renderEmployeeHTML(hass, entityId) {
         <div class="sensor-chip">
           <ha-icon icon="${type.icon}"></ha-icon>
           <span>${sEnt.state} ${unit}</span>
+          ${sparkline(series[sId])}
         </div>`;
     }
   });
@@ -114,6 +195,7 @@ function renderEmployeeHTML(hass, entityId) {
         </div>
       </div>
       <div class="progress-container" title="Cel: 8h"><div class="progress-bar ${progressClass}" style="width: ${progressPct}%"></div></div>
+      ${weekHtml}
       ${sensorsHtml ? `<div class="sensors-row">${sensorsHtml}</div>` : ''}
     </div>
   `;
@@ -156,7 +238,7 @@ class EmployeeDashboard extends HTMLElement {
     if (employees.length === 0) {
       this.content.innerHTML = "<div style='padding:20px;opacity:0.6'>Brak pracowników.</div>";
     } else {
-      this.content.innerHTML = employees.map(eid => renderEmployeeHTML(hass, eid)).join('');
+      this.content.innerHTML = employees.map(eid => renderEmployeeHTML(hass, eid, () => this.render())).join('');
     }
   }
   getCardSize() { return 3; }
@@ -165,6 +247,7 @@ class EmployeeDashboard extends HTMLElement {
 class EmployeeCard extends HTMLElement {
   setConfig(c) { if (!c.name) throw new Error('Podaj imię!'); this.config = c; }
   set hass(hass) {
+    this._hass = hass;
     const id = this.config.name.toLowerCase().trim().replace(/ /g, "_");
     const keys = Object.keys(hass.states);
     const entityId = keys.find(k => k.includes(id) && k.endsWith('_status'));
@@ -173,7 +256,7 @@ class EmployeeCard extends HTMLElement {
       this.innerHTML = `<style>${SHARED_STYLES}</style><div id="card-content"></div>`;
       this.content = this.querySelector('#card-content');
     }
-    if (entityId) this.content.innerHTML = renderEmployeeHTML(hass, entityId);
+    if (entityId) this.content.innerHTML = renderEmployeeHTML(hass, entityId, () => { this.hass = this._hass; });
     else this.content.innerHTML = `Nie znaleziono pracownika: ${this.config.name}`;
   }
   getCardSize() { return 1; }
@@ -1,54 +1,51 @@
-import json
-import os
-import requests
-import sqlite3
-import shutil
 import time
+PROCESS_START = time.monotonic()  # przed pozostałymi importami - czas do pierwszego ticku liczymy z nimi
+
+import os
+import signal
+import sys
 import threading
 from datetime import datetime
-from flask import Flask, request, jsonify, render_template, Response, send_file
+from flask import Flask, request, jsonify, render_template, Response
+from addon_options import DATA_DIR, get_option
+import metrics
+from card_install import card_resource_url, register_card_resource, sync_card_file
+from checkpoint import StatusCheckpoint
+from ha_client import HA, API_URL, HEADERS, TOKEN
+from ha_websocket import StateStream, ws_url_from_api
+from employee_registry import EmployeeRegistry
+from detection import ICONS, WORKING, Detector
+import http_cache
+from history_store import HistoryWriter
+from series_store import SeriesStore
+from managed_entities import ManagedEntities
+from monitor_snapshot import SnapshotReader, SnapshotWriter
+from poll_scheduler import BULK_READ_MIN, PollScheduler
+from profiling import PROFILES, instrument_flask
+from sensor_catalog import SensorCatalog, bump_generation
+from state_publisher import StatePublisher
 
 # --- KONFIGURACJA ŚCIEŻEK ---
-DATA_FILE = "/data/employees.json"
-STATUS_FILE = "/data/status.json"
-OPTIONS_FILE = "/data/options.json"
-DB_FILE = "/data/employee_history.db"
-HISTORY_FILE = "/data/history.json"
+DATA_FILE = os.path.join(DATA_DIR, "employees.json")
+STATUS_FILE = os.path.join(DATA_DIR, "status.json")
+MANAGED_FILE = os.path.join(DATA_DIR, "managed_entities.json")
+DB_FILE = os.path.join(DATA_DIR, "employee_history.db")
+HISTORY_FILE = os.path.join(DATA_DIR, "history.json")
 HA_WWW_DIR = "/config/www"
 CARD_URL_RESOURCE = "/local/employee-card.js"
 SOURCE_CARD_FILE = "/app/employee-card.js"
 
-SUPERVISOR_TOKEN = os.environ.get("SUPERVISOR_TOKEN")
-TOKEN = ""
-API_URL = ""
-
-if SUPERVISOR_TOKEN:
-    TOKEN = SUPERVISOR_TOKEN
-    API_URL = "http://supervisor/core/api"
-    # Zmieniona informacja w logu, żeby widzieć skąd startujemy
-    print(">>> [API] Używam Supervizora (Adres: supervisor/core/api)", flush=True)
-else:
-    # Ten blok jest tylko awaryjny (jeśli w ogóle nie ma Supervisora)
-    print(">>> [API] OSTRZEŻENIE: Brak Supervizora - Fallback na plik opcji.", flush=True)
-    try:
-        if os.path.exists(OPTIONS_FILE):
-            with open(OPTIONS_FILE, 'r') as f:
-                opts = json.load(f)
-                TOKEN = opts.get("ha_token", "").strip()
-    except: pass
-    
-    # Używamy adresu wewnętrznego HA, ale on jest zawodny bez Supervizora
-    API_URL = "http://homeassistant:8123/api"
-    
-if not TOKEN:
-    print("!!! [API] Błąd: Brak tokena do komunikacji z HA.", flush=True)
-    
-HEADERS = {
-    "Authorization": f"Bearer {TOKEN}",
-    "Content-Type": "application/json",
-}
+WS_URL = os.environ.get("HA_WS_URL") or ws_url_from_api(API_URL)
+
+# Silnik ticku: "thread" (sekwencyjna ocena) albo "asyncio" (równoległa, wymaga aiohttp)
+ENGINE = str(get_option("engine", "thread"))
+ENGINE_CONCURRENCY = int(get_option("engine_concurrency", 16))
+TICK_BUDGET = int(get_option("engine_tick_deadline", 8))  # sekundy: termin na zapytania do HA w jednym ticku (tick co 10 s)
 
 app = Flask(__name__)
+metrics.instrument_flask(app)
+instrument_flask(app, PROFILES)
+http_cache.instrument_flask(app)  # po metrykach: after_request działa w odwrotnej kolejności, metryki widzą 304
 
 # --- KONFIGURACJA JEDNOSTEK ---
 UNIT_MAP = {
@@ -63,7 +60,7 @@ UNIT_MAP = {
 }
 
 # Budujemy listę suffixów dynamicznie, żeby niczego nie pominąć przy usuwaniu
-MANAGED_SUFFIXES = ["_status", "_czas_pracy"]
+MANAGED_SUFFIXES = ["_status", "_czas_pracy", "_czas_tydzien"]
 for k, v in UNIT_MAP.items():
     s = f"_{v['suffix']}"
     if s not in MANAGED_SUFFIXES:
@@ -76,142 +73,197 @@ PRETTY_NAMES = {
     "connectivity": "Połączenie"
 }
 
+TICK_INTERVAL = 10    # sekundy przerwy między tickami
+API_BACKOFF_START = 0.5  # sekundy: pierwsza przerwa przy czekaniu na API HA
+API_BACKOFF_MAX = 30     # sekundy: górny limit przerwy (podwajanej po każdej próbie)
+STATS_LOG_EVERY = 60  # co ile ticków logujemy podsumowanie
+PUBLISH_WORKERS = 8   # maksymalna liczba równoległych zapisów stanów do HA
+RECONCILE_INTERVAL = 3600  # sekundy: pełny przegląd stanów HA w poszukiwaniu osieroconych encji
+
 # --- FUNKCJE POMOCNICZE ---
 
 def log(msg):
     print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
 
 def wait_for_api():
+    # Gotowe API zwykle odpowiada od razu; gdy HA jeszcze startuje, przerwy rosną 0.5 s -> 30 s
     log(f"Sprawdzanie połączenia z API: {API_URL} ...")
+    started = time.monotonic()
+    delay, attempts = API_BACKOFF_START, 0
     while True:
+        attempts += 1
         try:
-            r = requests.get(f"{API_URL}/", headers=HEADERS, timeout=5)
+            r = HA.request("GET", "/")
             if r.status_code in [200, 201, 401, 404, 405]:
-                log(">>> POŁĄCZENIE Z API NAWIĄZANE! <<<")
+                log(f">>> POŁĄCZENIE Z API NAWIĄZANE! <<< ({attempts}. próba, {time.monotonic() - started:.1f} s)")
                 return
         except Exception:
             pass
-        time.sleep(5)
+        time.sleep(delay)
+        delay = min(API_BACKOFF_MAX, delay * 2)
 
 def install_and_register_card():
     if not os.path.exists(SOURCE_CARD_FILE): return
     DEST_FILE = os.path.join(HA_WWW_DIR, "employee-card.js")
     try:
-        if not os.path.exists(HA_WWW_DIR): os.makedirs(HA_WWW_DIR)
-        shutil.copy2(SOURCE_CARD_FILE, DEST_FILE)
-    except: pass
+        if sync_card_file(SOURCE_CARD_FILE, DEST_FILE): log(f"Zaktualizowano kartę: {DEST_FILE}")
+    except OSError as e: log(f"Błąd kopiowania karty: {e}")
 
-    api_url = f"{API_URL}/lovelace/resources"
     try:
-        get_res = requests.get(api_url, headers=HEADERS)
-        if get_res.status_code == 200:
-            for res in get_res.json():
-                if res['url'] == CARD_URL_RESOURCE: return
-        requests.post(api_url, headers=HEADERS, json={"type": "module", "url": CARD_URL_RESOURCE})
-    except: pass
+        url = card_resource_url(CARD_URL_RESOURCE, SOURCE_CARD_FILE)
+        if register_card_resource(HA, url) != "exists": log(f"Zarejestrowano kartę: {url}")
+    except Exception as e: log(f"Błąd rejestracji karty: {e}")
 
-def init_db():
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS work_history
-                     (work_date TEXT, employee_name TEXT, minutes_worked INTEGER, 
-                     UNIQUE(work_date, employee_name))''')
-        conn.commit()
-        conn.close()
-    except: pass
+HISTORY = None  # HistoryWriter - jedno połączenie SQLite na cały proces logiki
+SERIES = None   # SeriesStore - szeregi czasowe kopii sensorów, na tym samym połączeniu
 
-def log_minute_to_db(employee_name):
+def init_db():
+    global HISTORY, SERIES
     try:
-        today = datetime.now().strftime("%Y-%m-%d")
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        try:
-            c.execute("INSERT INTO work_history (work_date, employee_name, minutes_worked) VALUES (?, ?, 1)", (today, employee_name))
-        except sqlite3.IntegrityError:
-            c.execute("UPDATE work_history SET minutes_worked = minutes_worked + 1 WHERE work_date=? AND employee_name=?", (today, employee_name))
-        conn.commit()
-        conn.close()
-    except: pass
+        HISTORY = HistoryWriter(DB_FILE)
+        migrated = HISTORY.migrate_history_json(HISTORY_FILE)
+        if migrated: log(f"Przeniesiono {migrated} wpisów z {HISTORY_FILE} do bazy")
+        SERIES = SeriesStore(HISTORY.conn)
+    except Exception as e: log(f"Błąd otwarcia bazy historii: {e}")
+
+def save_series(now, force=False):
+    if not SERIES: return
+    try: SERIES.save(now, force=force)
+    except Exception as e: log(f"Błąd zapisu szeregów czasowych: {e}")
+
+def flush_history(now):
+    # Zmiany sesji z całego ticku trafiają do bazy jedną transakcją
+    if not HISTORY: return
+    started = time.perf_counter()
+    try: HISTORY.flush(now)
+    except Exception as e: log(f"Błąd zapisu historii: {e}")
+    metrics.SQLITE_FLUSH_SECONDS.observe(time.perf_counter() - started)
+
+def load_week_base(work_date):
+    # Minuty z wcześniejszych dni tygodnia (sumy okresowe w bazie); bieżący dzień dolicza tick
+    if not HISTORY: return {}
+    try: return HISTORY.week_before(work_date)
+    except Exception as e:
+        log(f"Błąd odczytu sum tygodniowych: {e}")
+        return {}
+
+REGISTRY = EmployeeRegistry(DATA_FILE)
 
 def get_data():
-    if not os.path.exists(DATA_FILE): return []
-    try:
-        with open(DATA_FILE, 'r') as f: return json.load(f)
-    except: return []
-
-def load_json(file_path):
-    if not os.path.exists(file_path): return []
-    try:
-        with open(file_path, 'r') as f: return json.load(f)
-    except: return []
+    # Parsowanie employees.json tylko gdy plik faktycznie się zmienił
+    return REGISTRY.all()
 
-def save_json(file_path, data):
-    with open(file_path, 'w') as f: json.dump(data, f, indent=4)
+# Dziennik zmienionych liczników zamiast przepisywania status.json co tick
+CHECKPOINT = StatusCheckpoint(
+    STATUS_FILE,
+    write_interval=int(get_option("status_write_interval", 60)),
+    compact_every=int(get_option("status_compact_every", 100)),
+)
 
 def load_status():
-    if not os.path.exists(STATUS_FILE): return {"date": datetime.now().strftime("%Y-%m-%d"), "counters": {}}
-    try:
-        with open(STATUS_FILE, 'r') as f: return json.load(f)
+    try: return CHECKPOINT.load(datetime.now().strftime("%Y-%m-%d"))
     except: return {"date": datetime.now().strftime("%Y-%m-%d"), "counters": {}}
 
-def save_status(status_data):
-    try:
-        with open(STATUS_FILE, 'w') as f: json.dump(status_data, f, indent=4)
-    except: pass
+def save_status(status_data, force=False):
+    try: CHECKPOINT.update(status_data, force=force)
+    except Exception as e: log(f"Błąd zapisu statusu: {e}")
 
-def get_state_full(entity_id):
-    if not entity_id: return None
+# Trzymany przez czas zapisu ticku, żeby SIGTERM nie wszedł w połowę flush()
+TICK_LOCK = threading.Lock()
+
+def shutdown(signum, frame):
+    log("Zatrzymywanie (SIGTERM) - zapis liczników i zamknięcie sesji...")
+    locked = TICK_LOCK.acquire(timeout=5)
+    try:
+        CHECKPOINT.flush()
+        save_series(time.time(), force=True)
+        SNAPSHOT.persist()
+        if HISTORY: HISTORY.close(time.time())
+    except Exception as e: log(f"Błąd przy zamykaniu: {e}")
+    finally:
+        if locked: TICK_LOCK.release()
+    sys.exit(0)
+
+def get_all_states():
     try:
-        r = requests.get(f"{API_URL}/states/{entity_id}", headers=HEADERS, timeout=5)
+        r = HA.request("GET", "/states", timeout=10)
         if r.status_code == 200: return r.json()
     except: pass
     return None
 
+def fetch_states(entity_ids):
+    # entity_id -> stan albo None (404); encje z błędem połączenia pomijane
+    results = {}
+    for eid in entity_ids:
+        try: r = HA.request("GET", f"/states/{eid}")
+        except Exception: continue
+        if r.status_code == 200: results[eid] = r.json()
+        elif r.status_code == 404: results[eid] = None
+    return results
+
+def read_due(due, engine=None):
+    # (wyniki, bulk): przy wielu zaległych sensorach jeden GET /states filtrowany lokalnie,
+    # przy kilku - zapytania per sensor (równolegle w silniku asyncio)
+    if len(due) >= BULK_READ_MIN:
+        states = get_all_states()
+        if states is None: return {}, True  # wszystkie zaległe wracają do kolejki na następny tick
+        index = {s['entity_id']: s for s in states if 'entity_id' in s}
+        return {eid: index.get(eid) for eid in due}, True
+    return (engine.fetch_states(due) if engine else fetch_states(due)), False
+
+def post_state(entity_id, payload):
+    try:
+        r = HA.request("POST", f"/states/{entity_id}", json=payload)
+        return r.status_code in [200, 201]
+    except: return False
+
+PUBLISHER = StatePublisher(post_state, workers=PUBLISH_WORKERS)
+
 def set_state(entity_id, state, friendly, icon, unit=None):
+    # Zapis trafia do kolejki; wysyłka (tylko zmienionych) w PUBLISHER.flush() na końcu ticku
     attrs = {
         "friendly_name": friendly, 
         "icon": icon, 
         "managed_by": "employee_manager" # KLUCZOWE: Oznaczamy, że to my zarządzamy tym sensorem
     }
     if unit: attrs["unit_of_measurement"] = unit
-    try: requests.post(f"{API_URL}/states/{entity_id}", headers=HEADERS, json={"state": str(state), "attributes": attrs}, timeout=5)
-    except: pass
+    PUBLISHER.queue(entity_id, state, attrs)
 
 def delete_ha_state(entity_id):
-    try:
-        requests.delete(f"{API_URL}/states/{entity_id}", headers=HEADERS, timeout=5)
+    # True - encji nie ma już w HA (także 404); False - do ponowienia (błąd, termin, wyłącznik)
+    PUBLISHER.discard(entity_id)
+    try: r = HA.request("DELETE", f"/states/{entity_id}")
+    except Exception as e:
+        log(f"Nie udało się usunąć encji {entity_id}: {e}")
+        return False
+    if r.status_code in (200, 404):
         log(f"Usunięto encję: {entity_id}")
-    except: pass
-
-def get_clean_sensors():
-    sensors = []
-    try:
-        resp = requests.get(f"{API_URL}/states", headers=HEADERS, timeout=5)
-        if resp.status_code == 200:
-            all_states = resp.json()
-            for entity in all_states:
-                eid = entity['entity_id']
-                # Pomijamy encje zarządzane przez ten addon, żeby nie przypisać kopii do pracownika
-                attrs = entity.get("attributes", {})
-                if attrs.get("managed_by") == "employee_manager": continue
-                
-                if not (eid.startswith(("sensor.", "binary_sensor.", "switch.", "light."))): continue
-                # Tu można dodać więcej filtrów blacklist
-                sensors.append({"id": eid, "state": entity.get("state", "-"), "main_label": attrs.get("friendly_name", eid)})
-    except: pass
-    return sensors
+        return True
+    log(f"Nie udało się usunąć encji {entity_id}: HTTP {r.status_code}")
+    return False
+
+CATALOG = SensorCatalog(get_all_states)
+
+# Rejestr utworzonych przez nas encji - sprzątanie bez przeglądania wszystkich stanów HA
+MANAGED = ManagedEntities(MANAGED_FILE)
+
+def reconcile_managed(states_index, managed_now):
+    # Pełny przegląd: encje z managed_by spoza bieżącego zbioru (np. sprzed rejestru
+    # albo usunięte z pliku ręcznie). Ze snapshotu WebSocket albo jednym GET /states.
+    if states_index is None:
+        states = get_all_states()
+        if states is None: return
+        states_index = {s['entity_id']: s for s in states if 'entity_id' in s}
+    valid = set().union(*managed_now.values())
+    for eid, ent in states_index.items():
+        # Sprawdzamy czy to NASZ sensor (ma atrybut managed_by)
+        if ent.get('attributes', {}).get('managed_by') == 'employee_manager' and eid not in valid:
+            log(f"Wykryto osierocony sensor: {eid}. Usuwanie...")
+            delete_ha_state(eid)
 
 def save_daily_report(work_counters, report_date):
     try:
         log(f">>> Generowanie raportu dobowego za {report_date}...")
-        history = []
-        if os.path.exists(HISTORY_FILE):
-            try:
-                with open(HISTORY_FILE, 'r') as f: history = json.load(f)
-            except: pass
-
-        timestamp = f"{report_date} (Raport Dobowy)"
         snapshot = []
         emps = get_data() 
         for emp in emps:
@@ -220,191 +272,395 @@ def save_daily_report(work_counters, report_date):
             if name in work_counters: work_time = round(work_counters[name], 1)
             snapshot.append({"name": name, "work_time": work_time})
 
-        snapshot.sort(key=lambda x: x['name'])
-        history.insert(0, {"id": int(time.time()), "date": timestamp, "entries": snapshot})
-        if len(history) > 365: history = history[:365]
-        with open(HISTORY_FILE, 'w') as f: json.dump(history, f, indent=4)
-    except: pass
+        if not HISTORY: return
+        HISTORY.save_daily_report(report_date, snapshot)
+        # Retencja zamiast sztywnego limitu 365 wpisów (0 = trzymamy wszystko)
+        removed = HISTORY.apply_retention(int(get_option("history_retention_days", 365)))
+        if removed: log(f"Retencja historii: usunięto {removed} starych wpisów")
+    except Exception as e: log(f"Błąd zapisu raportu dobowego: {e}")
+
+# --- OCENA PRACOWNIKA ---
+def format_value(state):
+    try: return str(round(float(state), 1))
+    except: return state
+
+def evaluate_employee(emp, lookup):
+    # lookup(entity_id) -> pełny stan encji (dict) albo None
+    name = emp['name'].strip()
+    safe = name.lower().replace(" ", "_")
+    power = None      # najwyższa moc (W) ze wszystkich gniazdek pracownika
+    active = False    # któryś binary_sensor jest "on"
+    mirrors = []
+    sources = {}      # kopia -> sensory źródłowe, które ją tworzą
+    complete = True   # wszystkie sensory odczytane i dostępne - znamy pełny zbiór kopii
+    measurements = []
+
+    for eid in emp.get('sensors', []):
+        data = lookup(eid)
+        measurements.append({"label": eid, "value": format_value(data['state']) if data else "-",
+                             "unit": (data or {}).get('attributes', {}).get('unit_of_measurement') or ""})
+        if not data:
+            complete = False
+            continue
+        state_val = data['state']
+        if state_val in ['unavailable', 'unknown', 'None']:
+            complete = False
+            continue
+        
+        attrs = data.get('attributes', {})
+        unit = attrs.get('unit_of_measurement')
+        
+        if unit == 'W' or unit == 'kW':
+            try:
+                val = float(state_val)
+                if unit == 'kW': val *= 1000
+                power = val if power is None else max(power, val)
+            except: pass
+        
+        if eid.startswith("binary_sensor.") and state_val == 'on': active = True
+        
+        # Tworzenie kopii sensora (np. sensor.jan_moc)
+        suffix_info = None
+        if unit in UNIT_MAP: suffix_info = UNIT_MAP[unit]
+        
+        if suffix_info:
+            new_id = f"sensor.{safe}_{suffix_info['suffix']}"
+            mirrors.append((new_id, state_val, f"{name} {suffix_info['suffix']}", suffix_info['icon'], unit))
+            sources.setdefault(new_id, set()).add(eid)
+
+    # O statusie decyduje DETECTOR (progi i czasy z reguły pracownika), tu tylko odczyt
+    return {"power": power, "active": active, "mirrors": mirrors, "sources": sources, "complete": complete,
+            "measurements": measurements, "emp": emp}
+
+def create_engine():
+    # None = klasyczna pętla wątkowa; aiohttp (~0.2 s importu) ładujemy tylko dla silnika asyncio
+    if ENGINE != "asyncio": return None
+    from async_engine import AsyncEngine
+    try: engine = AsyncEngine(API_URL, HEADERS, evaluate_employee, concurrency=ENGINE_CONCURRENCY, deadline=TICK_BUDGET, log=log)
+    except RuntimeError as e:
+        log(f"{e} - używam silnika wątkowego")
+        return None
+    log(f"Silnik asyncio: do {ENGINE_CONCURRENCY} równoległych zapytań, termin ticku {TICK_BUDGET} s")
+    return engine
+
+# Snapshot monitora dla serwera WWW; kopia w /data zapisywana też przy zatrzymaniu
+SNAPSHOT = SnapshotWriter()
 
 # --- GŁÓWNA PĘTLA LOGIKI ---
-def logic_loop():
-    wait_for_api()
-    install_and_register_card() 
-    log(f"=== START SYSTEMU LOGIKI ===")
-    init_db()
-    
-    memory = load_status()
-    today_str = datetime.now().strftime("%Y-%m-%d")
-    if memory.get("date") != today_str:
-        memory = {"date": today_str, "counters": {}}
-    
-    work_counters = memory.get("counters", {})
-    last_loop_date = today_str
-
-    while True:
+class LogicLoop:
+    # Stan pętli między tickami; tick() to jeden pełny przebieg (używa go też tools/bench.py)
+    def __init__(self):
+        self.stream = None
+        self.memory = None
+        self.work_counters = {}
+        self.week_base = {}  # pracownik -> minuty z poprzednich dni bieżącego tygodnia ISO
+        self.last_loop_date = None
+        # Wyniki ostatniej oceny: nazwa -> wynik evaluate_employee()
+        self.evaluated = {}
+        self.retry = set()  # pracownicy przerwani terminem ticku - ocenimy ich ponownie w następnym
+        self.engine = None
+        self.poller = PollScheduler()  # harmonogram odczytów, gdy WebSocket nie działa
+        self.last_managed = None       # zbiór encji z ostatniego porównania z rejestrem (None = start)
+        self.mirror_sources = {}       # kopia -> sensory źródłowe, które ją tworzyły (z ocen w tym procesie)
+        self.last_reconcile = 0.0
+        self.monitor = SNAPSHOT
+        self.detector = Detector()
+        self.tick_no = 0
+        self.requests_sum = 0
+
+    def start(self):
+        init_db()
+
+        # Stany sensorów przychodzą zdarzeniami state_changed; REST tylko przy (re)synchronizacji
+        self.stream = StateStream(WS_URL, TOKEN, get_all_states, log, on_registry_change=bump_generation).start()
+
+        self.memory = load_status()
+        today_str = datetime.now().strftime("%Y-%m-%d")
+        if self.memory.get("date") != today_str:
+            self.memory = {"date": today_str, "counters": {}}
+
+        # Sesje w bazie + odtworzony dziennik liczników: minuty z dziennika, których baza nie ma
+        # (nieudany zapis przed awarią), wchodzą do dzisiejszej sumy; bez bazy liczy sam dziennik
+        if HISTORY:
+            try: HISTORY.restore_day(today_str, self.memory.get("counters", {}))
+            except Exception as e: log(f"Błąd odtwarzania liczników z dziennika: {e}")
+        self.work_counters = HISTORY.totals(today_str, time.time()) if HISTORY else self.memory.get("counters", {})
+        self.last_loop_date = today_str
+        self.week_base = load_week_base(today_str)
+        self.engine = create_engine()
+        return self
+
+    def tick(self):
+        requests_before = HA.stats["requests"]
         try:
-            current_date = datetime.now().strftime("%Y-%m-%d")
-            if current_date != last_loop_date:
-                save_daily_report(work_counters, last_loop_date)
-                work_counters = {}
-                memory = {"date": current_date, "counters": {}}
-                save_status(memory)
-                last_loop_date = current_date
-
-            emps = get_data()
-            
-            # Zbiór wszystkich ID, które są aktualnie "legalne" (używane przez pracowników)
-            valid_managed_ids = set()
-
-            for emp in emps:
-                name = emp['name'].strip()
-                safe = name.lower().replace(" ", "_")
-                
-                # Dodajemy standardowe sensory do listy "legalnych"
-                valid_managed_ids.add(f"sensor.{safe}_status")
-                valid_managed_ids.add(f"sensor.{safe}_czas_pracy")
-
-                if name not in work_counters: work_counters[name] = 0.0
-                is_working = False
+            with HA.budget(TICK_BUDGET):
+                tick_now = time.time()
+                current_date = datetime.fromtimestamp(tick_now).strftime("%Y-%m-%d")
+                # Sesje trwające przez północ dzielimy na 00:00, więc suma za poprzedni dzień jest dokładna
+                if HISTORY: HISTORY.split_days(tick_now)
+                if current_date != self.last_loop_date:
+                    if HISTORY: self.work_counters = HISTORY.totals(self.last_loop_date, tick_now)
+                    save_daily_report(self.work_counters, self.last_loop_date)
+                    transitions, suppressed = self.detector.take_day()
+                    log(f"Zmiany statusu {self.last_loop_date}: {sum(transitions.values())} wysłanych do HA, "
+                        f"{suppressed} wahań odrzuconych" + "".join(f"; {n}: {c}" for n, c in sorted(transitions.items())))
+                    self.work_counters = {}
+                    self.memory = {"date": current_date, "counters": {}}
+                    save_status(self.memory, force=True)
+                    self.last_loop_date = current_date
+                    # Wczorajsze minuty muszą być w bazie, zanim policzymy z niej sumę tygodnia
+                    with TICK_LOCK: flush_history(tick_now)
+                    self.week_base = load_week_base(current_date)
+
+                timer = metrics.PhaseTimer()
+                emps = get_data()
+                self.detector.compile(emps, REGISTRY.version)
+                changed, full_resync = self.stream.take_changes()
+                changed_names = REGISTRY.names_for_sensors(changed)
+                live = self.stream.live
+                if self.engine: self.engine.begin_tick()
+                if live:
+                    # Jeden snapshot stanów na tick z tabeli WebSocket; z niego czytają
+                    # wszyscy pracownicy i garbage collector.
+                    states_index = self.stream.snapshot()
+                    self.poller.clear()
+                    eval_index = states_index
+                else:
+                    # Bez WebSocketu: odczyt tylko sensorów, którym minął termin w harmonogramie
+                    states_index = None
+                    self.poller.sync((eid for emp in emps for eid in emp.get('sensors', [])), tick_now)
+                    due = self.poller.due(tick_now)
+                    if due:
+                        results, bulk = read_due(due, self.engine)
+                        changed = self.poller.apply(due, results, tick_now, bulk=bulk)
+                        changed_names = REGISTRY.names_for_sensors(changed)
+                    eval_index = self.poller.snapshot()
+                lookup = eval_index.get
+
+                # Encje, których HA już nie zna (np. po restarcie HA), trzeba wysłać ponownie
+                if states_index is not None:
+                    for eid in PUBLISHER.known():
+                        if eid not in states_index: PUBLISHER.forget(eid)
+                timer.mark("read")
+
+                # Ponowna ocena tylko gdy zmienił się któryś z sensorów pracownika (albo konfiguracja)
+                def needs_eval(emp):
+                    result = self.evaluated.get(emp['name'].strip())
+                    return (full_resync or result is None or result["emp"] != emp
+                            or emp['name'] in changed_names or emp['name'].strip() in self.retry)
+
+                def on_result(result):
+                    self.evaluated[result["emp"]['name'].strip()] = result
+                    for new_id, state_val, friendly, icon, unit in result["mirrors"]:
+                        set_state(new_id, state_val, friendly, icon, unit)
+
+                dirty = [emp for emp in emps if needs_eval(emp)]
+                if self.engine:
+                    self.retry = set(self.engine.evaluate_all(dirty, eval_index, on_result, PUBLISHER))
+                else:
+                    for emp in dirty: on_result(evaluate_employee(emp, lookup))
+
+                # Zbiór wszystkich ID, które są aktualnie "legalne" (używane przez pracowników)
+                managed_now = {}  # pracownik -> encje, które dla niego utrzymujemy
+                roster = set()
+                monitor_rows = []
+                # Pełny przegląd stanów HA tylko gdy znamy kopie wszystkich pracowników
+                all_read = live or self.poller.all_read()
+
+                for emp in emps:
+                    name = emp['name'].strip()
+                    safe = name.lower().replace(" ", "_")
+                    roster.add(name)
                 
-                for eid in emp.get('sensors', []):
-                    data = get_state_full(eid)
-                    if not data: continue
-                    state_val = data['state']
-                    if state_val in ['unavailable', 'unknown', 'None']: continue
-                    
-                    attrs = data.get('attributes', {})
-                    unit = attrs.get('unit_of_measurement')
-                    
-                    if unit == 'W' or unit == 'kW':
-                        try:
-                            val = float(state_val)
-                            if unit == 'kW': val *= 1000
-                            if val > float(emp.get('threshold', 20.0)): is_working = True
-                        except: pass
-                    
-                    if eid.startswith("binary_sensor.") and state_val == 'on': is_working = True
-                    
-                    # Tworzenie kopii sensora (np. sensor.jan_moc)
-                    suffix_info = None
-                    if unit in UNIT_MAP: suffix_info = UNIT_MAP[unit]
-                    
-                    if suffix_info:
-                        new_id = f"sensor.{safe}_{suffix_info['suffix']}"
-                        valid_managed_ids.add(new_id) # Ten sensor jest legalny
-                        set_state(new_id, state_val, f"{name} {suffix_info['suffix']}", suffix_info['icon'], unit)
-
-                status = "Pracuje" if is_working else "Nieobecny"
-                if is_working: 
-                    work_counters[name] += (10/60)
-                    log_minute_to_db(name)
+                    # Dodajemy standardowe sensory do listy "legalnych"
+                    own_ids = managed_now[name] = {f"sensor.{safe}_status", f"sensor.{safe}_czas_pracy"}
+                    if HISTORY: own_ids.add(f"sensor.{safe}_czas_tydzien")
+
+                    if name not in self.work_counters: self.work_counters[name] = 0.0
+
+                    # Kopie utrzymywane dotąd (po starcie - z rejestru encji) przechodzą dalej, dopóki ich
+                    # sensor jest na liście pracownika: niedostępny albo jeszcze nieodczytany sensor nie
+                    # może skasować kopii (i jej historii) w HA.
+                    prev = self.last_managed.get(name, set()) if self.last_managed is not None else MANAGED.for_employee(name)
+                    result = self.evaluated.get(name)
+                    if result is None:
+                        # Nowy pracownik przerwany terminem - nie znamy jeszcze jego kopii sensorów
+                        all_read = False
+                        own_ids |= prev
+                        continue
+                    self.mirror_sources.update(result["sources"])
+                    sensors = set(emp.get('sensors', []))
+                    for eid in prev - own_ids - result["sources"].keys():
+                        known = self.mirror_sources.get(eid)
+                        # Usuwamy tylko kopię sensora zdjętego z listy; bez wiedzy o źródle (po restarcie)
+                        # dopiero gdy wszystkie sensory pracownika są odczytane i żaden jej nie tworzy
+                        if known is not None and not known & sensors: continue
+                        if known is None and result["complete"]: continue
+                        own_ids.add(eid)
+                    status = self.detector.update(name, result["power"], result["active"], tick_now)
+                    is_working = status == WORKING
+
+                    for m in result["mirrors"]:
+                        own_ids.add(m[0]) # Ten sensor jest legalny
+                        if SERIES: SERIES.add(m[0], name, m[4], tick_now, m[1])
+
+                    if HISTORY:
+                        # Czas z zegara: start/koniec sesji, a nie liczba ticków. Zmiana statusu liczy się
+                        # od chwili pierwszego odczytu, a nie od końca odczekiwania min_on/min_off.
+                        HISTORY.track(name, is_working, self.detector.entered(name, tick_now))
+                        self.work_counters[name] = HISTORY.minutes(current_date, name, tick_now)
+                    elif is_working:
+                        self.work_counters[name] += (10/60)
                 
-                set_state(f"sensor.{safe}_status", status, f"{name} - Status", "mdi:laptop" if is_working else "mdi:account-off")
-                set_state(f"sensor.{safe}_czas_pracy", round(work_counters[name], 1), f"{name} - Czas", "mdi:clock", "min")
+                    set_state(f"sensor.{safe}_status", status, f"{name} - Status", ICONS[status])
+                    set_state(f"sensor.{safe}_czas_pracy", round(self.work_counters[name], 1), f"{name} - Czas", "mdi:clock", "min")
+                    if HISTORY:
+                        # Pełne minuty - encja zmienia się najwyżej raz na minutę (deduplikacja w PUBLISHER)
+                        week = self.week_base.get(name, 0) + self.work_counters[name]
+                        set_state(f"sensor.{safe}_czas_tydzien", int(week), f"{name} - Tydzień", "mdi:calendar-week", "min")
+                    monitor_rows.append({"name": emp['name'], "status": status, "work_time": str(round(self.work_counters[name], 1)),
+                                         "measurements": result["measurements"],
+                                         "transitions": self.detector.transitions.get(name, 0)})
+
+                for name in list(self.evaluated):
+                    if name not in roster: del self.evaluated[name]
+                valid = set().union(*managed_now.values())
+                for eid in list(self.mirror_sources):
+                    if eid not in valid: del self.mirror_sources[eid]
+
+                if HISTORY: HISTORY.close_all(tick_now, keep=roster)
+                metrics.ROSTER_SIZE.set(len(roster))
+                timer.mark("evaluate")
+
+                if self.engine: self.engine.flush(PUBLISHER)
+                else: PUBLISHER.flush()
+                timer.mark("publish")
+                # Gotowy wynik ticku dla /api/monitor w procesie WWW
+                try: self.monitor.publish(monitor_rows)
+                except OSError as e: log(f"Błąd zapisu snapshotu monitora: {e}")
+                with TICK_LOCK:
+                    flush_history(tick_now)
+                    save_series(tick_now)
+                    self.memory["counters"] = self.work_counters
+                    save_status(self.memory)
+                timer.mark("save_status")
+
+                # --- BEZPIECZNE CZYSZCZENIE (GARBAGE COLLECTOR) ---
+                # Zwykle tylko różnica względem rejestru encji, gdy zmienił się zbiór utrzymywanych
+                # encji (zmiana listy pracowników/sensorów, start); pełny przegląd stanów HA rzadko.
+                try:
+                    # Encje, których DELETE się nie udał (także z panelu), czekają w rejestrze na ponowienie
+                    if managed_now != self.last_managed or MANAGED.pending():
+                        removed = MANAGED.replace(managed_now)
+                        failed = set()
+                        for eid in sorted(removed):
+                            log(f"Wykryto osierocony sensor: {eid}. Usuwanie...")
+                            if not delete_ha_state(eid): failed.add(eid)
+                        MANAGED.defer(failed)
+                        if SERIES: SERIES.retain(roster, removed)
+                        self.last_managed = managed_now
+                    if all_read and tick_now - self.last_reconcile >= RECONCILE_INTERVAL:
+                        reconcile_managed(states_index, managed_now)
+                        self.last_reconcile = tick_now
+                    metrics.MANAGED_ENTITIES.set(sum(len(ids) for ids in managed_now.values()))
+                except Exception as e:
+                    log(f"Błąd podczas czyszczenia: {e}")
+                timer.mark("gc")
+                timer.finish()
 
-            memory["counters"] = work_counters
-            save_status(memory)
-
-            # --- BEZPIECZNE CZYSZCZENIE (GARBAGE COLLECTOR) ---
-            # Pobieramy wszystkie stany z HA
-            try:
-                r = requests.get(f"{API_URL}/states", headers=HEADERS, timeout=5)
-                if r.status_code == 200:
-                    all_entities = r.json()
-                    for ent in all_entities:
-                        # Sprawdzamy czy to NASZ sensor (ma atrybut managed_by)
-                        if ent.get('attributes', {}).get('managed_by') == 'employee_manager':
-                            eid = ent['entity_id']
-                            # Jeśli nie ma go na liście legalnych -> USUŃ
-                            if eid not in valid_managed_ids:
-                                log(f"Wykryto osierocony sensor: {eid}. Usuwanie...")
-                                delete_ha_state(eid)
-            except Exception as e:
-                log(f"Błąd podczas czyszczenia: {e}")
-            
         except Exception as e:
             log(f"Krytyczny błąd w pętli: {e}")
 
-        time.sleep(10)
+        tick_requests = HA.stats["requests"] - requests_before
+        self.tick_no += 1
+        self.requests_sum += tick_requests
+        if self.tick_no % STATS_LOG_EVERY == 0:
+            ps = PUBLISHER.last_stats
+            log(f"Statystyki: {tick_requests} zapytań HTTP w ostatnim ticku, średnio {self.requests_sum / STATS_LOG_EVERY:.1f}/tick; "
+                f"zapisy stanów: wysłane {ps['sent']}, pominięte {ps['skipped']}, błędy {ps['failed']}"
+                + (f"; asyncio: {self.engine.stats['requests']} zapytań, maruderzy {self.engine.stats['stragglers']}" if self.engine else ""))
+            planned, actual = self.poller.rate(time.time())
+            if planned or actual:
+                log(f"Harmonogram odczytów (bez WebSocketu): plan {planned:.1f}/min, faktycznie {actual:.1f}/min")
+            self.requests_sum = 0
+
+def warm_up():
+    # Poza ścieżką pierwszego ticku: rejestracja karty i katalog sensorów dla strony głównej
+    install_and_register_card()
+    try: CATALOG.get()
+    except Exception as e: log(f"Błąd przygotowania katalogu sensorów: {e}")
 
-threading.Thread(target=logic_loop, daemon=True).start()
+def logic_loop():
+    wait_for_api()
+    api_ready = time.monotonic() - PROCESS_START
+    log(f"=== START SYSTEMU LOGIKI ===")
+    threading.Thread(target=warm_up, daemon=True).start()
+    loop = LogicLoop().start()
+    PROFILES.call("tick", loop.tick)
+    first_tick = time.monotonic() - PROCESS_START
+    metrics.TIME_TO_FIRST_TICK.set(first_tick)
+    log(f"Pierwszy tick po {first_tick:.2f} s od startu procesu (API gotowe po {api_ready:.2f} s)")
+    while True:
+        time.sleep(TICK_INTERVAL)
+        # Profil cProfile tylko dla ticków zleconych przez POST /api/profiles
+        PROFILES.call("tick", loop.tick)
 
 # --- WEB ROUTES ---
+# Raporty, historia, statystyki, szeregi i /metrics serwuje tylko web_server.py (gunicorn) -
+# proces logiki nie dzieli wątków ticku z długimi zapytaniami do bazy.
 @app.route('/')
 def index():
-    return render_template('index.html', all_sensors=get_clean_sensors())
+    return render_template('index.html', all_sensors=CATALOG.get()[0])
+
+EMPLOYEES_JSON = http_cache.VersionedJson()  # lista serializowana raz na wersję rejestru
 
 @app.route('/api/employees', methods=['GET', 'POST'])
 def api_employees():
     if request.method == 'POST':
-        data = request.json
-        emps = load_json(DATA_FILE)
-        emps = [e for e in emps if e['name'] != data['name']]
-        emps.append(data)
-        save_json(DATA_FILE, emps)
+        REGISTRY.upsert(request.json)
         return jsonify({"status":"ok"})
-    return jsonify(load_json(DATA_FILE))
-
-@app.route('/api/employees/<int:i>', methods=['DELETE'])
-def api_del(i):
-    emps = load_json(DATA_FILE)
-    if 0 <= i < len(emps):
-        to_delete = emps[i]
-        safe_name = to_delete['name'].lower().replace(" ", "_")
-        
-        # Natychmiastowe usunięcie znanych sensorów (reszta wyleci w pętli Garbage Collector)
-        for suffix in MANAGED_SUFFIXES:
-            delete_ha_state(f"sensor.{safe_name}{suffix}")
-            
-        del emps[i]
-        save_json(DATA_FILE, emps)
+    return EMPLOYEES_JSON.response(*REGISTRY.snapshot())
+
+@app.route('/api/employees/<path:name>', methods=['DELETE'])
+def api_del(name):
+    to_delete = REGISTRY.delete(name)
+    if to_delete is None: return jsonify({"status": "not_found"}), 404
+    # Natychmiastowe usunięcie encji z rejestru; bez wpisu (stara instalacja) zgadujemy po suffixach
+    entity_ids = MANAGED.remove_employee(to_delete['name'].strip())
+    if not entity_ids:
+        safe_name = to_delete['name'].strip().lower().replace(" ", "_")
+        entity_ids = {f"sensor.{safe_name}{suffix}" for suffix in MANAGED_SUFFIXES}
+    MANAGED.defer({eid for eid in sorted(entity_ids) if not delete_ha_state(eid)})
     return jsonify({"status":"ok"})
 
+MONITOR = SnapshotReader()
+
 @app.route('/api/monitor', methods=['GET'])
 def api_monitor():
-    emps = load_json(DATA_FILE)
-    res = []
-    for emp in emps:
-        safe = emp['name'].lower().replace(" ","_")
-        status = get_ha_state(f"sensor.{safe}_status") or "N/A"
-        time = get_ha_state(f"sensor.{safe}_czas_pracy") or "0"
-        meas = []
-        for entity_id in emp.get('sensors', []):
-            val = get_ha_state(entity_id)
-            meas.append({"label": entity_id, "value": val, "unit": ""}) 
-        res.append({"name": emp['name'], "status": status, "work_time": time, "measurements": meas})
-    return jsonify(res)
-
-@app.route('/download_report')
-def download_report():
-    try:
-        conn = sqlite3.connect(DB_FILE)
-        c = conn.cursor()
-        c.execute("SELECT work_date, employee_name, minutes_worked FROM work_history ORDER BY work_date DESC")
-        rows = c.fetchall()
-        conn.close()
-        si = io.StringIO()
-        cw = csv.writer(si, delimiter=';')
-        cw.writerow(["Data", "Pracownik", "Minuty", "Godziny"])
-        for r in rows:
-            cw.writerow([r[0], r[1], r[2], round(r[2]/60, 2)])
-        return Response(si.getvalue(), mimetype="text/csv", headers={"Content-disposition": "attachment; filename=Raport.csv"})
-    except: return "Błąd", 500
+    snap = MONITOR.refresh()
+    return Response(snap.employees_json, mimetype="application/json",
+                    headers={"X-Monitor-Version": str(snap.version), "X-Monitor-Restored": "1" if snap.restored else "0"})
 
 @app.route('/api/install_card', methods=['POST'])
 def api_install_card():
     install_and_register_card()
     return jsonify({"success": True, "message": "Zainstalowano (odśwież przeglądarkę)"})
 
-@app.route('/api/history', methods=['GET'])
-def api_history():
-    return jsonify(load_json(HISTORY_FILE))
+CARD_FILE = http_cache.StaticFile(SOURCE_CARD_FILE)
 
 @app.route('/local/employee-card.js')
 def serve_card_file():
-    if SOURCE_CARD_FILE and os.path.exists(SOURCE_CARD_FILE):
-        return send_file(SOURCE_CARD_FILE, mimetype='application/javascript')
-    return "Not found", 404
+    # Z odciskiem (?v=) zgodnym z treścią: immutable na rok; bez niego - walidacja ETagiem
+    card = CARD_FILE.load()
+    if card is None: return "Not found", 404
+    data, tag = card
+    fingerprinted = request.args.get('v') == tag[:12]
+    return http_cache.finalize(request, Response(data, mimetype='application/javascript'), tag=tag,
+                               cache_control=http_cache.IMMUTABLE if fingerprinted else "no-cache",
+                               best=True)
 
 if __name__ == '__main__':
+    threading.Thread(target=logic_loop, daemon=True).start()
+    # s6 przy zatrzymaniu dodatku wysyła SIGTERM; handler musi być zarejestrowany w głównym wątku
+    signal.signal(signal.SIGTERM, shutdown)
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
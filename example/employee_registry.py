@@ -0,0 +1,95 @@
+import hashlib
+import json
+import threading
+
+from atomic_file import atomic_write, file_lock, file_signature
+
+# --- REJESTR PRACOWNIKÓW (employees.json) ---
+# Plik jest parsowany ponownie tylko gdy zmieni się jego mtime/rozmiar i treść (hash).
+# Indeksy po imieniu i po sensorze dają wyszukiwanie O(1). Zapis: blokada pliku
+# (flock, wspólna dla procesu logiki i serwera WWW) + plik tymczasowy i rename,
+# więc żaden proces nie zobaczy połowy pliku ani nie nadpisze cudzej zmiany.
+
+
+class EmployeeRegistry:
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self.version = 0  # rośnie przy każdej faktycznej zmianie listy
+        self._stat = None
+        self._hash = None
+        self._emps = []
+        self.by_name = {}
+        self.by_sensor = {}
+        self._lock = threading.RLock()
+
+    # --- ODCZYT ---
+    def _refresh(self):
+        sig = file_signature(self.path)
+        if sig == self._stat: return
+        data = b""
+        if sig:
+            try:
+                with open(self.path, 'rb') as f: data = f.read()
+            except OSError: return
+        self._stat = sig
+        digest = hashlib.sha1(data).hexdigest()
+        if digest == self._hash: return
+        try: emps = json.loads(data) if data else []
+        except ValueError: return  # uszkodzony plik - zostajemy przy ostatniej dobrej wersji
+        self._hash = digest
+        self._set(emps)
+
+    def _set(self, emps):
+        self._emps = emps
+        self.by_name = {e['name']: e for e in emps}
+        by_sensor = {}
+        for e in emps:
+            for eid in e.get('sensors', []): by_sensor.setdefault(eid, []).append(e['name'])
+        self.by_sensor = by_sensor
+        self.version += 1
+
+    def all(self):
+        with self._lock:
+            self._refresh()
+            return list(self._emps)
+
+    def snapshot(self):
+        # (wersja, lista) odczytane razem - wersja zawsze opisuje zwróconą listę
+        with self._lock:
+            self._refresh()
+            return self.version, list(self._emps)
+
+    def get(self, name):
+        with self._lock:
+            self._refresh()
+            return self.by_name.get(name)
+
+    def names_for_sensors(self, entity_ids):
+        with self._lock:
+            self._refresh()
+            return {n for eid in entity_ids for n in self.by_sensor.get(eid, ())}
+
+    # --- ZAPIS ---
+    def _file_lock(self): return file_lock(self.lock_path)
+
+    def _write(self, emps):
+        atomic_write(self.path, json.dumps(emps, indent=4).encode("utf-8"), fsync=True)
+        self._stat = None  # następny odczyt przeładuje plik (i policzy nowy hash)
+        self._refresh()
+
+    def upsert(self, emp):
+        with self._lock, self._file_lock():
+            self._refresh()
+            emps = [e for e in self._emps if e['name'] != emp['name']]
+            emps.append(emp)
+            self._write(emps)
+
+    def delete(self, name):
+        # Zwraca usuniętego pracownika albo None, jeśli nie istniał
+        with self._lock, self._file_lock():
+            self._refresh()
+            removed = self.by_name.get(name)
+            if removed is None: return None
+            self._write([e for e in self._emps if e['name'] != name])
+            return removed
@@ -0,0 +1,14 @@
+# --- KONFIGURACJA GUNICORNA (serwer WWW dodatku) ---
+# Liczbę i rodzaj workerów ustawia run.sh z opcji web_workers / web_worker_class / web_threads.
+# Tutaj tylko haki, które muszą działać niezależnie od tych opcji.
+import metrics
+
+# Aplikacja importowana raz w procesie głównym (Flask, requests, prometheus_client) i dzielona
+# z workerami przez fork - worker po starcie lub restarcie od razu przyjmuje żądania.
+# Moduł nie otwiera przy imporcie połączeń ani wątków (strumień SSE startuje przy pierwszym kliencie).
+preload_app = True
+
+
+def child_exit(server, worker):
+    # Pliki metryk zmarłego workera (restart po timeout / max_requests) nie mogą fałszować gauge
+    metrics.mark_process_dead(worker.pid)
@@ -0,0 +1,161 @@
+import contextvars
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import metrics
+from addon_options import get_option
+
+# --- WSPÓLNY KLIENT API HOME ASSISTANT ---
+# Jedna sesja requests z pulą połączeń keep-alive dla employee_logic i web_server.
+# Każde wywołanie ma limit czasu, ponawianie z losowym (jitter) odstępem i bezpiecznik
+# (circuit breaker), a budget() ogranicza łączny czas wszystkich wywołań w bloku,
+# np. jednego ticku albo jednego ładowania strony.
+
+SUPERVISOR_TOKEN = os.environ.get("SUPERVISOR_TOKEN")
+TOKEN = ""
+API_URL = ""
+
+if SUPERVISOR_TOKEN:
+    TOKEN = SUPERVISOR_TOKEN
+    API_URL = "http://supervisor/core/api"
+    # Zmieniona informacja w logu, żeby widzieć skąd startujemy
+    print(">>> [API] Używam Supervizora (Adres: supervisor/core/api)", flush=True)
+else:
+    # Ten blok jest tylko awaryjny (jeśli w ogóle nie ma Supervisora)
+    print(">>> [API] OSTRZEŻENIE: Brak Supervizora - Fallback na plik opcji.", flush=True)
+    TOKEN = str(get_option("ha_token", "")).strip()
+
+    # Używamy adresu wewnętrznego HA, ale on jest zawodny bez Supervizora
+    # (HA_API_URL pozwala podpiąć lokalny stub z tools/ha_stub.py)
+    API_URL = os.environ.get("HA_API_URL", "http://homeassistant:8123/api")
+
+if not TOKEN:
+    print("!!! [API] Błąd: Brak tokena do komunikacji z HA.", flush=True)
+
+HEADERS = {
+    "Authorization": f"Bearer {TOKEN}",
+    "Content-Type": "application/json",
+}
+
+CONNECT_TIMEOUT = 3
+READ_TIMEOUT = 5
+RETRIES = 2
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 2.0
+RETRY_STATUSES = (502, 503, 504)
+BREAKER_THRESHOLD = 5   # tyle kolejnych porażek otwiera bezpiecznik
+BREAKER_COOLDOWN = 30   # po tylu sekundach przepuszczamy jedno próbne zapytanie
+POOL_SIZE = 16
+
+# Termin (time.monotonic) bieżącego budżetu; ContextVar, żeby przechodził do puli wątków przez copy_context()
+_DEADLINE = contextvars.ContextVar("ha_deadline", default=None)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    pass
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    pass
+
+
+class HAClient:
+    def __init__(self, api_url, headers, pool_size=POOL_SIZE):
+        self.api_url = api_url
+        self.session = requests.Session()
+        self.session.headers.update(headers)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.stats = {"requests": 0, "errors": 0, "retries": 0, "rejected": 0}
+        self._failures = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def budget(self, seconds):
+        # Zagnieżdżony budżet nie może wydłużyć zewnętrznego
+        deadline = time.monotonic() + seconds
+        outer = _DEADLINE.get()
+        if outer is not None: deadline = min(deadline, outer)
+        token = _DEADLINE.set(deadline)
+        try: yield deadline
+        finally: _DEADLINE.reset(token)
+
+    def _count(self, key):
+        with self._lock: self.stats[key] += 1
+
+    def _check_breaker(self):
+        with self._lock:
+            if self._failures < BREAKER_THRESHOLD: return
+            now = time.monotonic()
+            if now < self._open_until:
+                self.stats["rejected"] += 1
+                raise CircuitOpenError("Bezpiecznik API HA otwarty")
+            # Półotwarty: przepuszczamy jedną próbę, kolejne czekają na jej wynik
+            self._open_until = now + BREAKER_COOLDOWN
+
+    def _record(self, ok):
+        with self._lock:
+            if ok:
+                self._failures = 0
+                return
+            self._failures += 1
+            self.stats["errors"] += 1
+            if self._failures >= BREAKER_THRESHOLD:
+                self._open_until = time.monotonic() + BREAKER_COOLDOWN
+
+    def _timeout(self, read_timeout):
+        deadline = _DEADLINE.get()
+        if deadline is None: return (CONNECT_TIMEOUT, read_timeout)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0: raise DeadlineExceeded("Wyczerpany budżet czasu na zapytania do HA")
+        return (min(CONNECT_TIMEOUT, remaining), min(read_timeout, remaining))
+
+    def request(self, method, path, timeout=READ_TIMEOUT, retries=RETRIES, **kwargs):
+        try: self._check_breaker()
+        except CircuitOpenError:
+            metrics.observe_ha(method, path, "circuit_open", None)
+            raise
+        url = f"{self.api_url}{path}"
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                self._count("requests")
+                resp = self.session.request(method, url, timeout=self._timeout(timeout), **kwargs)
+                metrics.observe_ha(method, path, resp.status_code, time.perf_counter() - started)
+                if resp.status_code not in RETRY_STATUSES:
+                    self._record(True)
+                    return resp
+                error = None
+            except DeadlineExceeded:
+                metrics.observe_ha(method, path, "deadline", None)
+                raise
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                metrics.observe_ha(method, path, "timeout" if isinstance(e, requests.exceptions.Timeout) else "error",
+                                   time.perf_counter() - started)
+                resp, error = None, e
+
+            if attempt >= retries:
+                self._record(False)
+                if error: raise error
+                return resp
+            attempt += 1
+            self._count("retries")
+            delay = min(BACKOFF_CAP, BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            deadline = _DEADLINE.get()
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                self._record(False)
+                if error: raise error
+                return resp
+            time.sleep(delay)
+
+
+HA = HAClient(API_URL, HEADERS)
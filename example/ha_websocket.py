@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+import websocket
+
+# --- SUBSKRYPCJA ZDARZEŃ state_changed PRZEZ WEBSOCKET HA ---
+# Jedno stałe połączenie zamiast odpytywania REST każdego sensora co tick.
+# Tabela stanów trzymana jest w pamięci, a pętla logiki pobiera z niej
+# tylko zbiór encji, które zmieniły się od ostatniego odczytu.
+
+RECONNECT_MIN = 1
+RECONNECT_MAX = 60
+RECV_TIMEOUT = 30
+
+
+def ws_url_from_api(api_url):
+    url = api_url.replace("https://", "wss://", 1).replace("http://", "ws://", 1).rstrip("/")
+    # Proxy Supervisora: /core/api -> /core/websocket, HA bezpośrednio: /api -> /api/websocket
+    if url.endswith("/core/api"): return url[:-len("/api")] + "/websocket"
+    return url + "/websocket"
+
+
+class StateStream:
+    def __init__(self, ws_url, token, fetch_all_states, log=print, on_registry_change=None):
+        self.ws_url = ws_url
+        self.token = token
+        self.fetch_all_states = fetch_all_states  # callable -> lista stanów z /states albo None
+        # callable bez argumentów: zmienił się zbiór encji (rejestr, nowa/usunięta encja, resync)
+        self.on_registry_change = on_registry_change
+        self.log = log
+        self.live = False
+        self._states = {}
+        self._changed = set()
+        self._full_resync = False
+        self._lock = threading.Lock()
+        self._msg_id = 0
+        self._ws = None
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    # --- API DLA PĘTLI LOGIKI ---
+    def get(self, entity_id):
+        with self._lock: return self._states.get(entity_id)
+
+    def snapshot(self):
+        with self._lock: return dict(self._states)
+
+    def take_changes(self):
+        # Zwraca (zmienione entity_id, czy była pełna resynchronizacja) i zeruje bufor
+        with self._lock:
+            changed, full = self._changed, self._full_resync
+            self._changed, self._full_resync = set(), False
+        return changed, full
+
+    # --- WĄTEK POŁĄCZENIA ---
+    def _run(self):
+        delay = RECONNECT_MIN
+        while True:
+            try:
+                self._connect()
+                delay = RECONNECT_MIN
+                self._listen()
+            except Exception as e:
+                self.log(f"[WS] Połączenie przerwane: {e}")
+            self.live = False
+            try:
+                if self._ws: self._ws.close()
+            except: pass
+            self._ws = None
+            time.sleep(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    def _next_id(self):
+        self._msg_id += 1
+        return self._msg_id
+
+    def _send(self, payload):
+        self._ws.send(json.dumps(payload))
+
+    def _recv(self):
+        return json.loads(self._ws.recv())
+
+    def _connect(self):
+        self._msg_id = 0
+        self._ws = websocket.create_connection(self.ws_url, timeout=10)
+        msg = self._recv()
+        if msg.get("type") == "auth_required":
+            self._send({"type": "auth", "access_token": self.token})
+            msg = self._recv()
+        if msg.get("type") != "auth_ok":
+            raise RuntimeError(f"Autoryzacja odrzucona ({msg.get('type')})")
+
+        self._send({"id": self._next_id(), "type": "subscribe_events", "event_type": "state_changed"})
+        if self.on_registry_change:
+            self._send({"id": self._next_id(), "type": "subscribe_events", "event_type": "entity_registry_updated"})
+        # Subskrypcja PRZED pobraniem /states - zdarzenia z czasu pobierania czekają w gnieździe
+        # i zostaną nałożone na snapshot (starsze odrzuca porównanie last_updated).
+        self._resync()
+        self.live = True
+        self.log(f"[WS] Subskrypcja state_changed aktywna ({len(self._states)} encji)")
+
+    def _resync(self):
+        states = self.fetch_all_states()
+        if states is None: raise RuntimeError("Nie udało się pobrać /states")
+        table = {s['entity_id']: s for s in states if 'entity_id' in s}
+        with self._lock:
+            self._states = table
+            self._changed = set()
+            self._full_resync = True
+        self._registry_changed()
+
+    def _registry_changed(self):
+        if not self.on_registry_change: return
+        try: self.on_registry_change()
+        except Exception as e: self.log(f"[WS] Błąd obsługi zmiany rejestru: {e}")
+
+    def _listen(self):
+        self._ws.settimeout(RECV_TIMEOUT)
+        waiting_pong = False
+        while True:
+            try:
+                msg = self._recv()
+            except websocket.WebSocketTimeoutException:
+                # Cisza na łączu - sprawdzamy czy HA jeszcze żyje
+                if waiting_pong: raise RuntimeError("Brak odpowiedzi na ping")
+                self._send({"id": self._next_id(), "type": "ping"})
+                waiting_pong = True
+                continue
+            waiting_pong = False
+            if msg.get("type") == "event":
+                event = msg.get("event", {})
+                if event.get("event_type") == "entity_registry_updated": self._registry_changed()
+                else: self._apply_event(event)
+            elif msg.get("type") == "result" and not msg.get("success", True):
+                self.log(f"[WS] Błąd odpowiedzi: {msg.get('error')}")
+
+    def _apply_event(self, event):
+        data = event.get("data", {})
+        eid = data.get("entity_id")
+        if not eid: return
+        new_state = data.get("new_state")
+        with self._lock:
+            old = self._states.get(eid)
+            if new_state is None:
+                self._states.pop(eid, None)
+            else:
+                # Zdarzenie starsze niż snapshot z resynchronizacji - pomijamy
+                if old and new_state.get("last_updated", "") < old.get("last_updated", ""): return
+                self._states[eid] = new_state
+            self._changed.add(eid)
+        if (old is None) != (new_state is None): self._registry_changed()
@@ -0,0 +1,451 @@
+import csv
+import importlib.util
+import io
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+# --- ZAPIS HISTORII PRACY (SQLite) ---
+# Jedno stałe połączenie w trybie WAL; wszystkie zmiany z ticku idą jedną transakcją.
+# Czas pracy to sesje start/koniec (work_sessions) liczone z zegara ściennego, więc
+# wynik nie zależy od tego, jak często i jak równo działa pętla. Dzienne sumy w
+# work_history są z nich wyliczane (a nie doliczane co tick) i służą raportom.
+# WAL pozwala /download_report czytać równolegle bez blokowania zapisu.
+# Raporty dobowe (daily_reports) są indeksowane po dacie i pracowniku, a
+# /api/history czyta je stronami zamiast całego dokumentu.
+# Sumy tygodniowe (ISO), miesięczne i roczne per pracownik (work_rollups) utrzymują
+# wyzwalacze na work_history - każdy zapis minut z ticku poprawia je o różnicę, więc
+# /api/stats nie przelicza dziennych wierszy.
+
+REPORTS_PAGE_MAX = 365
+STATS_PAGE_MAX = 520
+DAILY_TARGET_MINUTES = 480  # cel dzienny (8 h) - ten sam co pasek postępu karty
+ROLLUP_PERIODS = ("week", "month", "year")
+
+# Klucz okresu w SQL; tydzień ISO liczymy od czwartku tego tygodnia (SQLite < 3.46 nie zna %V/%G)
+_THURSDAY = "date({d}, '-3 days', 'weekday 4')"
+ROLLUP_KEY_SQL = {
+    "week": f"printf('%s-W%02d', strftime('%Y', {_THURSDAY}), (CAST(strftime('%j', {_THURSDAY}) AS INTEGER) - 1) / 7 + 1)",
+    "month": "substr({d}, 1, 7)",
+    "year": "substr({d}, 1, 4)",
+}
+EXPORT_BATCH = 500  # wierszy pobieranych z kursora naraz przy eksporcie
+# openpyxl (~0.3 s importu) ładujemy dopiero przy eksporcie XLSX, nie przy starcie procesów
+XLSX_AVAILABLE = importlib.util.find_spec("openpyxl") is not None
+
+
+def connect(db_file, readonly=False):
+    if readonly:
+        conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, timeout=5)
+    else:
+        conn = sqlite3.connect(db_file, timeout=5, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # W WAL fsync tylko przy checkpoincie - wystarczające dla liczników minut, oszczędza kartę SD
+        conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def day_of(ts):
+    return datetime.fromtimestamp(ts).strftime("%Y-%m-%d")
+
+
+def next_midnight(work_date):
+    return (datetime.strptime(work_date, "%Y-%m-%d") + timedelta(days=1)).timestamp()
+
+
+def period_key(period, work_date):
+    # Ten sam klucz co ROLLUP_KEY_SQL: "2026-W42", "2026-10", "2026"
+    d = datetime.strptime(work_date, "%Y-%m-%d")
+    if period == "week":
+        year, week, _ = d.isocalendar()
+        return f"{year}-W{week:02d}"
+    return work_date[:7] if period == "month" else work_date[:4]
+
+
+def _rollup_triggers():
+    # Każdy zapis do work_history (także upsert z flush()) koryguje sumy o różnicę old/new
+    def apply(row, sign):
+        return "".join(
+            f"INSERT INTO work_rollups (period, period_key, employee_name, minutes, days, days_over_target) "
+            f"VALUES ('{period}', {ROLLUP_KEY_SQL[period].format(d=row + '.work_date')}, {row}.employee_name, "
+            f"{sign}{row}.minutes_worked, {sign}({row}.minutes_worked > 0), {sign}({row}.minutes_worked >= {DAILY_TARGET_MINUTES})) "
+            f"ON CONFLICT(period, period_key, employee_name) DO UPDATE SET minutes = minutes + excluded.minutes, "
+            f"days = days + excluded.days, days_over_target = days_over_target + excluded.days_over_target;\n"
+            for period in ROLLUP_PERIODS)
+    return [
+        f"CREATE TRIGGER work_rollups_ins AFTER INSERT ON work_history BEGIN\n{apply('NEW', '')}END",
+        f"CREATE TRIGGER work_rollups_upd AFTER UPDATE ON work_history BEGIN\n{apply('OLD', '-')}{apply('NEW', '')}END",
+        f"CREATE TRIGGER work_rollups_del AFTER DELETE ON work_history BEGIN\n{apply('OLD', '-')}END",
+    ]
+
+
+class HistoryWriter:
+    def __init__(self, db_file):
+        self.conn = connect(db_file)
+        with self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS work_history
+                         (work_date TEXT, employee_name TEXT, minutes_worked INTEGER,
+                         UNIQUE(work_date, employee_name))''')
+            # UNIQUE(work_date, employee_name) daje już indeks pod zakres dat; ten obsługuje filtr po pracowniku
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_work_history_employee ON work_history (employee_name, work_date)")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS work_sessions
+                         (id INTEGER PRIMARY KEY, work_date TEXT, employee_name TEXT,
+                         start_ts REAL, end_ts REAL, last_seen REAL)''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_work_sessions_date ON work_sessions (work_date, employee_name)")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS daily_reports
+                         (report_date TEXT, employee_name TEXT, work_time REAL, created_at INTEGER,
+                         PRIMARY KEY (report_date, employee_name))''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_daily_reports_employee ON daily_reports (employee_name, report_date)")
+            self._init_rollups()
+            # Sesje otwarte w chwili awarii/restartu kończymy na ostatnim potwierdzonym ticku
+            self.conn.execute("UPDATE work_sessions SET end_ts = last_seen WHERE end_ts IS NULL")
+        self._lock = threading.Lock()
+        self._open = {}      # nazwa -> otwarta sesja (dict)
+        self._dirty = []     # sesje do zapisania w najbliższym flush()
+        self._closed = {}    # (data, nazwa) -> sekundy z zamkniętych sesji
+        self._restored = set()  # (data, nazwa) z minutami spoza sesji - do zapisania w najbliższym flush()
+        for d, n, sec in self.conn.execute(
+                "SELECT work_date, employee_name, SUM(end_ts - start_ts) FROM work_sessions "
+                "WHERE work_date >= ? GROUP BY work_date, employee_name",
+                ((datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d"),)):
+            self._closed[(d, n)] = sec or 0.0
+        self.restore_day(day_of(time.time()))
+
+    def restore_day(self, work_date, counters=None):
+        # Minuty dnia zapisane, zanim powstały sesje (work_history sprzed aktualizacji albo licznik
+        # z dziennika status.json, gdy zapis do bazy się nie udał), wchodzą jako zamknięta sesja-offset.
+        # Bez tego pierwszy flush() po restarcie nadpisałby dzień (i sumy okresowe) samymi nowymi sesjami.
+        floor = {n: m or 0 for n, m in self.conn.execute(
+            "SELECT employee_name, minutes_worked FROM work_history WHERE work_date = ?", (work_date,))}
+        for n, m in (counters or {}).items(): floor[n] = max(floor.get(n, 0), m or 0)
+        with self._lock:
+            for n, minutes in floor.items():
+                key = (work_date, n)
+                # Porównanie w pełnych minutach (jak w work_history) - zaokrąglenie nie dokłada sekund przy restarcie
+                if minutes > int(round(self._closed.get(key, 0.0) / 60)):
+                    self._closed[key] = minutes * 60
+                    self._restored.add(key)
+
+    def _init_rollups(self):
+        created = not self.conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'work_rollups'").fetchone()
+        self.conn.execute('''CREATE TABLE IF NOT EXISTS work_rollups
+                     (period TEXT, period_key TEXT, employee_name TEXT, minutes INTEGER,
+                     days INTEGER, days_over_target INTEGER,
+                     PRIMARY KEY (period, period_key, employee_name))''')
+        # Wyzwalacze odtwarzane przy każdym starcie - zmiana celu dziennego nie zostawi starej wersji
+        for name in ("work_rollups_ins", "work_rollups_upd", "work_rollups_del"):
+            self.conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        for sql in _rollup_triggers(): self.conn.execute(sql)
+        if created: self.rebuild_rollups()
+
+    def rebuild_rollups(self):
+        # Pełne przeliczenie z work_history - przy pierwszym starcie z tą tabelą (istniejąca historia)
+        self.conn.execute("DELETE FROM work_rollups")
+        for period in ROLLUP_PERIODS:
+            self.conn.execute(
+                f"INSERT INTO work_rollups (period, period_key, employee_name, minutes, days, days_over_target) "
+                f"SELECT ?, {ROLLUP_KEY_SQL[period].format(d='work_date')} AS k, employee_name, SUM(minutes_worked), "
+                f"SUM(minutes_worked > 0), SUM(minutes_worked >= ?) FROM work_history GROUP BY k, employee_name",
+                (period, DAILY_TARGET_MINUTES))
+
+    def week_before(self, work_date):
+        # Minuty z tygodnia ISO dnia work_date, bez samego work_date: {pracownik: minuty}.
+        # Wynik jest stały przez cały dzień - bieżący dzień dolicza się z minutes().
+        return {n: m for n, m in self.conn.execute(
+            "SELECT r.employee_name, r.minutes - COALESCE(h.minutes_worked, 0) FROM work_rollups r "
+            "LEFT JOIN work_history h ON h.employee_name = r.employee_name AND h.work_date = ? "
+            "WHERE r.period = 'week' AND r.period_key = ?", (work_date, period_key("week", work_date)))}
+
+    # --- SESJE ---
+    def track(self, employee_name, working, now):
+        with self._lock:
+            session = self._open.get(employee_name)
+            if working and not session:
+                session = {"id": None, "name": employee_name, "date": day_of(now), "start": now, "end": None}
+                self._open[employee_name] = session
+                self._dirty.append(session)
+            elif not working and session:
+                self._close(session, now)
+
+    def close_all(self, now, keep=()):
+        # Zamyka sesje osób spoza `keep` (np. usuniętych z listy) albo wszystkich przy wyłączaniu
+        with self._lock:
+            for name, session in list(self._open.items()):
+                if name not in keep: self._close(session, now)
+
+    def split_days(self, now):
+        # Sesja trwająca przez północ: część do 00:00 zostaje w starym dniu, reszta w nowym
+        today = day_of(now)
+        with self._lock:
+            for name, session in list(self._open.items()):
+                while session["date"] < today:
+                    boundary = next_midnight(session["date"])
+                    self._close(session, boundary)
+                    session = {"id": None, "name": name, "date": day_of(boundary), "start": boundary, "end": None}
+                    self._open[name] = session
+                    self._dirty.append(session)
+
+    def _close(self, session, end):
+        session["end"] = max(end, session["start"])
+        key = (session["date"], session["name"])
+        self._closed[key] = self._closed.get(key, 0.0) + session["end"] - session["start"]
+        self._open.pop(session["name"], None)
+        if not any(s is session for s in self._dirty): self._dirty.append(session)
+
+    def minutes(self, work_date, employee_name, now):
+        with self._lock:
+            sec = self._closed.get((work_date, employee_name), 0.0)
+            session = self._open.get(employee_name)
+            if session and session["date"] == work_date: sec += max(0.0, now - session["start"])
+        return sec / 60
+
+    def totals(self, work_date, now):
+        with self._lock: names = {n for d, n in self._closed if d == work_date} | set(self._open)
+        return {n: self.minutes(work_date, n, now) for n in names}
+
+    # --- ZAPIS ---
+    def flush(self, now):
+        with self._lock:
+            dirty, self._dirty = self._dirty, []
+            restored, self._restored = self._restored, set()
+            open_sessions = list(self._open.values())
+        touched = {(s["date"], s["name"]) for s in dirty + open_sessions} | restored
+        new_ids = []
+        try:
+            with self.conn:
+                for s in dirty:
+                    if s["id"] is None:
+                        cur = self.conn.execute(
+                            "INSERT INTO work_sessions (work_date, employee_name, start_ts, end_ts, last_seen) VALUES (?, ?, ?, ?, ?)",
+                            (s["date"], s["name"], s["start"], s["end"], s["end"] or now))
+                        new_ids.append((s, cur.lastrowid))
+                    else:
+                        self.conn.execute("UPDATE work_sessions SET end_ts = ?, last_seen = ? WHERE id = ?", (s["end"], s["end"] or now, s["id"]))
+                # Znacznik życia otwartych sesji - granica odzyskiwania po awarii
+                self.conn.execute("UPDATE work_sessions SET last_seen = ? WHERE end_ts IS NULL", (now,))
+                self.conn.executemany(
+                    "INSERT INTO work_history (work_date, employee_name, minutes_worked) VALUES (?, ?, ?) "
+                    "ON CONFLICT(work_date, employee_name) DO UPDATE SET minutes_worked = excluded.minutes_worked "
+                    # Bez zmiany minut nie ma UPDATE, więc trigger nie przelicza sum okresowych co tick
+                    "WHERE work_history.minutes_worked IS NOT excluded.minutes_worked",
+                    [(d, n, int(round(self.minutes(d, n, now)))) for d, n in touched])
+        except sqlite3.Error:
+            # Nie gubimy zmian - sesje wracają do kolejki i pójdą z następnym tickiem
+            with self._lock:
+                self._dirty = dirty + [s for s in self._dirty if not any(s is d for d in dirty)]
+                self._restored |= restored
+            raise
+        # id nadajemy dopiero po udanym commicie, żeby wycofana transakcja nie zostawiła martwych id
+        for s, row_id in new_ids: s["id"] = row_id
+        return len(touched)
+
+    # --- RAPORTY DOBOWE ---
+    def save_daily_report(self, report_date, entries):
+        # entries: lista {"name", "work_time"}; ponowny zapis tego samego dnia nadpisuje wiersze
+        created = int(time.time())
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO daily_reports (report_date, employee_name, work_time, created_at) VALUES (?, ?, ?, ?)",
+                [(report_date, e["name"], e["work_time"], created) for e in entries])
+
+    def apply_retention(self, days):
+        if not days or days <= 0: return 0
+        cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        with self.conn:
+            return self.conn.execute("DELETE FROM daily_reports WHERE report_date < ?", (cutoff,)).rowcount
+
+    def migrate_history_json(self, path):
+        # Jednorazowe przeniesienie starego history.json; plik zostaje jako kopia z sufiksem .migrated
+        if not os.path.exists(path): return 0
+        try:
+            with open(path, 'r') as f: history = json.load(f)
+        except: history = []
+        rows = []
+        for report in history:
+            report_date = str(report.get("date", ""))[:10]
+            for e in report.get("entries", []):
+                rows.append((report_date, e["name"], e.get("work_time", 0), report.get("id", 0)))
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO daily_reports (report_date, employee_name, work_time, created_at) VALUES (?, ?, ?, ?)", rows)
+        os.replace(path, path + ".migrated")
+        return len(rows)
+
+    def close(self, now):
+        try:
+            self.close_all(now)
+            self.flush(now)
+            self.conn.close()
+        except: pass
+
+
+def query_reports(db_file, date_from=None, date_to=None, employee=None, limit=30, cursor=None):
+    # Strona raportów od najnowszego; cursor = data ostatniego raportu z poprzedniej strony
+    limit = max(1, min(int(limit), REPORTS_PAGE_MAX))
+    where, params = [], []
+    if cursor: where.append("report_date < ?"); params.append(cursor)
+    if date_from: where.append("report_date >= ?"); params.append(date_from)
+    if date_to: where.append("report_date <= ?"); params.append(date_to)
+    if employee: where.append("employee_name = ?"); params.append(employee)
+    clause = ("WHERE " + " AND ".join(where)) if where else ""
+
+    if not os.path.exists(db_file): return {"reports": [], "next_cursor": None}
+    conn = connect(db_file, readonly=True)
+    try:
+        dates = [r[0] for r in conn.execute(
+            f"SELECT DISTINCT report_date FROM daily_reports {clause} ORDER BY report_date DESC LIMIT ?", params + [limit + 1])]
+        has_more = len(dates) > limit
+        dates = dates[:limit]
+        reports = []
+        if dates:
+            marks = ",".join("?" * len(dates))
+            emp_clause, emp_params = ("AND employee_name = ?", [employee]) if employee else ("", [])
+            by_date = {}
+            for d, name, work_time, created in conn.execute(
+                    f"SELECT report_date, employee_name, work_time, created_at FROM daily_reports "
+                    f"WHERE report_date IN ({marks}) {emp_clause} ORDER BY report_date DESC, employee_name",
+                    dates + emp_params):
+                report = by_date.get(d)
+                if report is None:
+                    report = by_date[d] = {"id": created, "date": f"{d} (Raport Dobowy)", "report_date": d, "entries": []}
+                    reports.append(report)
+                report["entries"].append({"name": name, "work_time": work_time})
+        return {"reports": reports, "next_cursor": dates[-1] if has_more else None}
+    except sqlite3.OperationalError:
+        # Baza jeszcze bez tabeli raportów (proces logiki nie wystartował)
+        return {"reports": [], "next_cursor": None}
+    finally:
+        conn.close()
+
+
+def query_stats(db_file, period="week", date_from=None, date_to=None, employee=None, limit=12):
+    # Sumy z work_rollups od najnowszego okresu; from/to to daty RRRR-MM-DD zamieniane na klucze okresów
+    if period not in ROLLUP_PERIODS: raise ValueError(f"Nieznany okres: {period}")
+    limit = max(1, min(int(limit), STATS_PAGE_MAX))
+    where, params = ["period = ?"], [period]
+    if date_from: where.append("period_key >= ?"); params.append(period_key(period, date_from))
+    if date_to: where.append("period_key <= ?"); params.append(period_key(period, date_to))
+    if employee: where.append("employee_name = ?"); params.append(employee)
+    out = {"period": period, "target_minutes": DAILY_TARGET_MINUTES, "periods": []}
+
+    if not os.path.exists(db_file): return out
+    conn = connect(db_file, readonly=True)
+    try:
+        keys = [r[0] for r in conn.execute(
+            f"SELECT DISTINCT period_key FROM work_rollups WHERE {' AND '.join(where)} ORDER BY period_key DESC LIMIT ?",
+            params + [limit])]
+        if not keys: return out
+        by_key = {}
+        for key, name, minutes, days, over in conn.execute(
+                f"SELECT period_key, employee_name, minutes, days, days_over_target FROM work_rollups "
+                f"WHERE {' AND '.join(where)} AND period_key IN ({','.join('?' * len(keys))}) "
+                f"ORDER BY period_key DESC, employee_name", params + keys):
+            entry = by_key.get(key)
+            if entry is None:
+                entry = by_key[key] = {"period_key": key, "employees": []}
+                out["periods"].append(entry)
+            entry["employees"].append({
+                "name": name, "minutes": minutes, "hours": round(minutes / 60, 2), "days": days,
+                "avg_minutes": round(minutes / days, 1) if days else 0.0, "days_over_target": over})
+        return out
+    except sqlite3.OperationalError:
+        # Baza sprzed wprowadzenia sum okresowych (proces logiki jeszcze ich nie założył)
+        return out
+    finally:
+        conn.close()
+
+
+# --- EKSPORT RAPORTU (CSV / XLSX) ---
+EXPORT_HEADERS = {
+    "daily": ["Data", "Pracownik", "Minuty", "Godziny"],
+    "monthly": ["Miesiąc", "Pracownik", "Dni", "Minuty", "Godziny"],
+}
+
+
+def iter_export_rows(db_file, date_from=None, date_to=None, employee=None, mode="daily"):
+    # Generator wierszy prosto z kursora - bez fetchall(), pamięć nie rośnie z zakresem
+    where, params = [], []
+    if date_from: where.append("work_date >= ?"); params.append(date_from)
+    if date_to: where.append("work_date <= ?"); params.append(date_to)
+    if employee: where.append("employee_name = ?"); params.append(employee)
+    clause = ("WHERE " + " AND ".join(where)) if where else ""
+    if mode == "monthly":
+        sql = (f"SELECT substr(work_date, 1, 7) AS month, employee_name, COUNT(*), SUM(minutes_worked) "
+               f"FROM work_history {clause} GROUP BY month, employee_name ORDER BY month DESC, employee_name")
+    else:
+        sql = f"SELECT work_date, employee_name, minutes_worked FROM work_history {clause} ORDER BY work_date DESC, employee_name"
+
+    if not os.path.exists(db_file): return
+    conn = connect(db_file, readonly=True)
+    try:
+        cur = conn.execute(sql, params)
+        while True:
+            batch = cur.fetchmany(EXPORT_BATCH)
+            if not batch: break
+            for r in batch:
+                minutes = r[-1] or 0
+                yield list(r) + [round(minutes / 60, 2)]
+    finally:
+        conn.close()
+
+
+def csv_chunks(header, rows):
+    buf = io.StringIO()
+    cw = csv.writer(buf, delimiter=';')
+    cw.writerow(header)
+    for i, row in enumerate(rows, 1):
+        cw.writerow(row)
+        if i % EXPORT_BATCH == 0:
+            yield buf.getvalue()
+            buf.seek(0); buf.truncate()
+    yield buf.getvalue()
+
+
+def xlsx_chunks(header, rows, chunk_size=64 * 1024):
+    # openpyxl w trybie write_only zapisuje wiersze strumieniowo do pliku tymczasowego
+    from openpyxl import Workbook
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Raport")
+    ws.append(header)
+    for row in rows: ws.append(row)
+    with tempfile.TemporaryFile() as tmp:
+        wb.save(tmp)
+        tmp.seek(0)
+        while True:
+            chunk = tmp.read(chunk_size)
+            if not chunk: break
+            yield chunk
+
+
+def build_export(db_file, args):
+    # args: parametry zapytania (from, to, employee, mode=daily|monthly, format=csv|xlsx)
+    # Zwraca (generator fragmentów, mimetype, nazwa pliku); ValueError przy złych parametrach
+    mode = args.get("mode", "daily")
+    fmt = args.get("format", "csv")
+    if mode not in EXPORT_HEADERS: raise ValueError(f"Nieznany tryb: {mode}")
+    if fmt not in ("csv", "xlsx"): raise ValueError(f"Nieznany format: {fmt}")
+    if fmt == "xlsx" and not XLSX_AVAILABLE: raise ValueError("Eksport XLSX wymaga pakietu openpyxl")
+
+    rows = iter_export_rows(db_file, args.get("from"), args.get("to"), args.get("employee"), mode)
+    name = "Raport" if mode == "daily" else "Raport_miesieczny"
+    if args.get("employee"): name += f"_{args.get('employee')}"
+    if args.get("from") or args.get("to"): name += f"_{args.get('from', '')}_{args.get('to', '')}"
+    # Parametry zapytania trafiają do nazwy pliku - tylko litery (także polskie), cyfry, "-" i "."
+    name = re.sub(r"[^\w.-]+", "_", name).strip("._") or "Raport"
+    if fmt == "xlsx":
+        return xlsx_chunks(EXPORT_HEADERS[mode], rows), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", f"{name}.xlsx"
+    return csv_chunks(EXPORT_HEADERS[mode], rows), "text/csv", f"{name}.csv"
+
+
+def attachment_header(filename):
+    # Content-Disposition jak w send_file: nazwa ASCII dla starych klientów + filename* (RFC 5987) z UTF-8
+    simple = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+    if simple == filename: return f'attachment; filename="{filename}"'
+    return f"attachment; filename=\"{simple}\"; filename*=UTF-8''{quote(filename, safe='')}"
@@ -0,0 +1,159 @@
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from atomic_file import file_signature
+
+try:
+    import brotli
+except ImportError:
+    brotli = None  # bez pakietu brotli zostaje gzip
+
+# --- CACHE HTTP: ETag, 304 i skompresowane warianty ---
+# Buforowane odpowiedzi JSON/JS dostają ETag z hasha treści; klient z pasującym
+# If-None-Match dostaje 304 bez treści. Skompresowana wersja (br/gzip wg Accept-Encoding)
+# jest liczona raz na ETag i trzymana w małym LRU, więc tablety odpytujące ten sam
+# monitor nie kompresują go za każdym razem. Nagłówek X-Representation mówi, który
+# wariant został wysłany i czy pochodził z pamięci.
+
+COMPRESS_MIN = 1024                 # bajty: mniejszych odpowiedzi nie opłaca się kompresować
+VARIANT_CACHE_BYTES = 8 * 1024 * 1024
+COMPRESSIBLE = ("application/json", "application/javascript", "text/javascript", "text/csv")
+IMMUTABLE = "public, max-age=31536000, immutable"
+ENCODING_SUFFIX = {"identity": "", "gzip": "-gz", "br": "-br"}
+
+
+def content_tag(data):
+    return hashlib.sha256(data).hexdigest()[:20]
+
+
+def json_bytes(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _compress(data, encoding, best):
+    if encoding == "br": return brotli.compress(data, quality=11 if best else 5)
+    return gzip.compress(data, compresslevel=9 if best else 6, mtime=0)
+
+
+class VariantCache:
+    # (tag, kodowanie) -> skompresowane bajty; LRU ograniczone łącznym rozmiarem
+    def __init__(self, max_bytes=VARIANT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, tag, encoding, data, best=False):
+        # Zwraca (bajty, True jeśli z pamięci)
+        key = (tag, encoding)
+        with self._lock:
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+                return body, True
+        body = _compress(data, encoding, best)
+        with self._lock:
+            if key not in self._items:
+                self._items[key] = body
+                self._size += len(body)
+                while self._size > self.max_bytes and len(self._items) > 1:
+                    _, old = self._items.popitem(last=False)
+                    self._size -= len(old)
+        return body, False
+
+
+VARIANTS = VariantCache()
+
+
+def negotiate(request):
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]: return "br"
+    if accept["gzip"]: return "gzip"
+    return "identity"
+
+
+def finalize(request, response, tag=None, cache_control="no-cache", best=False):
+    # ETag, 304 i kompresja dla gotowej (nie strumieniowanej) odpowiedzi
+    data = response.get_data()
+    tag = tag or content_tag(data)
+    encoding = negotiate(request) if len(data) >= COMPRESS_MIN else "identity"
+    response.headers["Cache-Control"] = cache_control
+    response.headers.add("Vary", "Accept-Encoding")
+    # If-None-Match może nieść ETag dowolnego wariantu - treść jest ta sama
+    if any(request.if_none_match.contains(tag + sfx) for sfx in ENCODING_SUFFIX.values()):
+        response.status_code = 304
+        response.set_data(b"")
+        response.headers.pop("Content-Type", None)
+        response.set_etag(tag + ENCODING_SUFFIX[encoding])
+        response.headers["X-Representation"] = "not-modified"
+        return response
+    response.set_etag(tag + ENCODING_SUFFIX[encoding])
+    if encoding == "identity":
+        response.headers["X-Representation"] = "identity"
+        return response
+    body, cached = VARIANTS.get(tag, encoding, data, best)
+    response.set_data(body)
+    response.headers["Content-Encoding"] = encoding
+    response.headers["X-Representation"] = f"{encoding}; variant={'cached' if cached else 'new'}"
+    return response
+
+
+def instrument_flask(app):
+    from flask import request
+
+    @app.after_request
+    def _http_cache(response):
+        # Tylko kompletne odpowiedzi 200 z treścią tekstową; SSE, pliki i eksporty idą bez zmian
+        if (request.method != "GET" or response.status_code != 200 or response.is_streamed
+                or response.direct_passthrough or "X-Representation" in response.headers
+                or "Content-Encoding" in response.headers
+                or response.mimetype not in COMPRESSIBLE):
+            return response
+        return finalize(request, response, tag=response.get_etag()[0],
+                        cache_control=response.headers.get("Cache-Control", "no-cache"))
+
+
+class VersionedJson:
+    # Treść JSON serializowana raz na wersję źródła (np. rejestru pracowników) razem z ETagiem
+    def __init__(self):
+        self._cached = (None, b"[]", None)  # (wersja, bajty, tag) - podmieniane w całości
+
+    def response(self, version, obj):
+        cached_version, body, tag = self._cached
+        if cached_version != version:
+            body = json_bytes(obj)
+            tag = content_tag(body)
+            self._cached = (version, body, tag)
+        from flask import Response
+        resp = Response(body, mimetype="application/json")
+        resp.set_etag(tag)
+        return resp
+
+
+class StaticFile:
+    # Plik serwowany z pamięci (karta Lovelace): treść i tag odświeżane po zmianie pliku.
+    # Jedna krotka podmieniana w całości - równoległe żądanie nie dostanie nowej treści ze starym
+    # tagiem; skompresowane warianty są w VARIANTS pod tym tagiem, więc też pasują do treści.
+    def __init__(self, path):
+        self.path = path
+        self._current = (None, None, None)  # (sygnatura pliku, bajty, tag)
+        self._lock = threading.Lock()
+
+    def load(self):
+        # Zwraca (bajty, tag) albo None, jeśli pliku nie ma
+        sig = file_signature(self.path)
+        if sig is None: return None
+        current = self._current
+        if current[0] != sig:
+            with self._lock:
+                current = self._current
+                if current[0] != sig:
+                    try:
+                        with open(self.path, 'rb') as f: data = f.read()
+                    except OSError: return None
+                    current = (sig, data, content_tag(data))
+                    self._current = current
+        return current[1], current[2]
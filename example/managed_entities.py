@@ -0,0 +1,87 @@
+import json
+import threading
+
+from atomic_file import atomic_write, file_lock, file_signature
+
+# --- REJESTR ENCJI ZARZĄDZANYCH PRZEZ DODATEK (managed_entities.json) ---
+# Dla każdego pracownika lista entity_id, które dodatek utworzył w HA (status, czas pracy,
+# kopie sensorów). Sprzątanie porównuje ten rejestr z bieżącym zbiorem encji zamiast
+# przeglądać wszystkie stany HA, a usunięcie pracownika kasuje dokładnie jego encje.
+# Zapis przez atomic_file: flock wspólny dla obu procesów + plik tymczasowy i rename.
+# Encje, których DELETE w HA się nie udał (termin, wyłącznik, błąd sieci), zostają w rejestrze
+# pod kluczem PENDING_DELETE - nie należą do nikogo, więc następne sprzątanie zwróci je ponownie.
+
+PENDING_DELETE = "__pending_delete__"
+
+
+class ManagedEntities:
+    def __init__(self, path):
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._stat = None
+        self._by_emp = {}
+        self._lock = threading.RLock()
+
+    # --- ODCZYT ---
+    def _refresh(self):
+        sig = file_signature(self.path)
+        if sig == self._stat: return
+        data = {}
+        if sig:
+            try:
+                with open(self.path, 'r') as f: data = json.load(f)
+            except (OSError, ValueError): return  # zostajemy przy ostatniej dobrej wersji
+        self._stat = sig
+        self._by_emp = {name: set(ids) for name, ids in data.items()}
+
+    def all_ids(self):
+        with self._lock:
+            self._refresh()
+            return set().union(*self._by_emp.values())
+
+    def for_employee(self, name):
+        with self._lock:
+            self._refresh()
+            return set(self._by_emp.get(name, ()))
+
+    # --- ZAPIS ---
+    def _file_lock(self): return file_lock(self.lock_path)
+
+    def _write(self, by_emp):
+        doc = {name: sorted(ids) for name, ids in sorted(by_emp.items())}
+        atomic_write(self.path, json.dumps(doc, indent=1).encode("utf-8"), fsync=True)
+        self._stat = None
+        self._refresh()
+
+    def pending(self):
+        with self._lock:
+            self._refresh()
+            return set(self._by_emp.get(PENDING_DELETE, ()))
+
+    def defer(self, entity_ids):
+        # Nieusunięte w HA encje wracają do rejestru do ponownej próby
+        if not entity_ids: return
+        with self._lock, self._file_lock():
+            self._refresh()
+            by_emp = {name: set(ids) for name, ids in self._by_emp.items()}
+            by_emp.setdefault(PENDING_DELETE, set()).update(entity_ids)
+            self._write(by_emp)
+
+    def replace(self, by_emp):
+        # Ustawia pełny stan rejestru {pracownik: zbiór entity_id}; zwraca encje, które z niego wypadły
+        with self._lock, self._file_lock():
+            self._refresh()
+            before = set().union(*self._by_emp.values())
+            new = {name: set(ids) for name, ids in by_emp.items() if ids}
+            if new != self._by_emp: self._write(new)
+            return before - set().union(*new.values())
+
+    def remove_employee(self, name):
+        # Zwraca encje usuniętego pracownika (pusty zbiór, jeśli rejestr go nie znał)
+        with self._lock, self._file_lock():
+            self._refresh()
+            if name not in self._by_emp: return set()
+            removed = self._by_emp[name]
+            rest = {n: ids for n, ids in self._by_emp.items() if n != name}
+            self._write(rest)
+            return removed - set().union(*rest.values())
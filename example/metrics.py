@@ -0,0 +1,113 @@
+import os
+import time
+
+from monitor_snapshot import SHM_DIR
+
+# --- METRYKI PROMETHEUS (/metrics) ---
+# prometheus_client w trybie wieloprocesowym: proces logiki i workery gunicorna zapisują
+# wartości do plików mmap w PROMETHEUS_MULTIPROC_DIR (run.sh czyści katalog przy starcie),
+# a /metrics w dowolnym procesie składa je w jedną odpowiedź. Pomiar to zapis do pamięci,
+# bez żadnej pracy, dopóki nikt nie odpytuje endpointu. Bez pakietu prometheus_client
+# wszystkie metryki są atrapami, a /metrics odpowiada 503.
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(SHM_DIR, "employee_metrics"))
+try:
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+    from prometheus_client import multiprocess
+except (ImportError, OSError):
+    multiprocess = None
+
+ENABLED = multiprocess is not None
+CONTENT_TYPE = CONTENT_TYPE_LATEST if ENABLED else "text/plain"
+
+FAST_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+TICK_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 4, 6, 8, 10, 15)
+
+
+class _Noop:
+    def labels(self, *args, **kwargs): return self
+    def observe(self, value): pass
+    def inc(self, amount=1): pass
+    def set(self, value): pass
+
+
+if ENABLED:
+    TICK_SECONDS = Histogram("employee_tick_duration_seconds", "Czas całego ticku pętli logiki", buckets=TICK_BUCKETS)
+    TICK_PHASE_SECONDS = Histogram("employee_tick_phase_duration_seconds", "Czas fazy ticku pętli logiki",
+                                   ["phase"], buckets=TICK_BUCKETS)
+    HA_REQUESTS = Counter("employee_ha_requests_total", "Zapytania do API HA", ["endpoint", "method", "code"])
+    HA_REQUEST_SECONDS = Histogram("employee_ha_request_duration_seconds", "Czas zapytania do API HA",
+                                   ["endpoint", "method"], buckets=FAST_BUCKETS)
+    SQLITE_FLUSH_SECONDS = Histogram("employee_sqlite_flush_duration_seconds", "Czas zapisu ticku do SQLite",
+                                     buckets=FAST_BUCKETS)
+    ROSTER_SIZE = Gauge("employee_roster_size", "Liczba pracowników na liście", multiprocess_mode="max")
+    MANAGED_ENTITIES = Gauge("employee_managed_entities", "Liczba encji utrzymywanych przez dodatek",
+                             multiprocess_mode="max")
+    HTTP_SECONDS = Histogram("employee_http_request_duration_seconds", "Czas obsługi żądania HTTP dodatku",
+                             ["route", "method", "status"], buckets=FAST_BUCKETS)
+    STATUS_TRANSITIONS = Counter("employee_status_transitions_total", "Zmiany statusu pracownika wysłane do HA", ["state"])
+    STATUS_FLAPS_SUPPRESSED = Counter("employee_status_flaps_suppressed_total",
+                                      "Wahania statusu odrzucone przez histerezę i minimalny czas trwania")
+    TIME_TO_FIRST_TICK = Gauge("employee_time_to_first_tick_seconds", "Czas od startu procesu logiki do końca pierwszego ticku",
+                               multiprocess_mode="max")
+else:
+    TICK_SECONDS = TICK_PHASE_SECONDS = HA_REQUESTS = HA_REQUEST_SECONDS = _Noop()
+    SQLITE_FLUSH_SECONDS = ROSTER_SIZE = MANAGED_ENTITIES = HTTP_SECONDS = _Noop()
+    STATUS_TRANSITIONS = STATUS_FLAPS_SUPPRESSED = TIME_TO_FIRST_TICK = _Noop()
+
+
+def ha_endpoint(path):
+    # Ograniczona liczba etykiet: /states/sensor.x -> /states/{entity_id}
+    path = path.split("?", 1)[0]
+    if path.startswith("/states/"): return "/states/{entity_id}"
+    return path or "/"
+
+
+def observe_ha(method, path, code, seconds):
+    endpoint = ha_endpoint(path)
+    HA_REQUESTS.labels(endpoint, method, str(code)).inc()
+    if seconds is not None: HA_REQUEST_SECONDS.labels(endpoint, method).observe(seconds)
+
+
+class PhaseTimer:
+    # mark("faza") zapisuje czas od poprzedniego znacznika; finish() - czas całego ticku
+    def __init__(self):
+        self.start = self._last = time.perf_counter()
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        TICK_PHASE_SECONDS.labels(phase).observe(now - self._last)
+        self._last = now
+
+    def finish(self):
+        TICK_SECONDS.observe(time.perf_counter() - self.start)
+
+
+def instrument_flask(app):
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe(response):
+        start = g.pop("metrics_start", None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "other"
+            HTTP_SECONDS.labels(route, request.method, str(response.status_code)).observe(time.perf_counter() - start)
+        return response
+
+
+def mark_process_dead(pid):
+    # Wywoływane przez gunicorna (child_exit) - gauge zmarłego workera nie wiszą w /metrics
+    if ENABLED: multiprocess.mark_process_dead(pid)
+
+
+def render():
+    # (treść, status) dla endpointu /metrics
+    if not ENABLED: return b"prometheus_client niedostepny\n", 503
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), 200
@@ -0,0 +1,152 @@
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+from addon_options import DATA_DIR
+from atomic_file import atomic_write
+
+# --- WSPÓLNY SNAPSHOT MONITORA (proces logiki -> serwer WWW) ---
+# Proces logiki po każdym ticku zapisuje gotowy wynik (status, czas, pomiary) do pliku
+# w pamięci (/dev/shm), tylko gdy treść się zmieniła, z rosnącym numerem wersji.
+# Serwer WWW sprawdza os.stat() i parsuje plik tylko po zmianie, a /api/monitor
+# odsyła gotowe bajty bez żadnego zapytania do HA.
+# Kopia snapshotu trafia też co PERSIST_EVERY sekund do /data, więc po restarcie dodatku
+# (pusty /dev/shm) panel od razu pokazuje ostatni znany stan, zanim minie pierwszy tick.
+
+SHM_DIR = os.environ.get("SHM_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+MONITOR_FILE = os.path.join(SHM_DIR, "employee_monitor.json")
+PERSIST_FILE = os.path.join(DATA_DIR, "monitor_snapshot.json")
+PERSIST_EVERY = 60  # sekundy: rzadziej niż tick, żeby nie zużywać karty SD
+
+
+class SnapshotWriter:
+    def __init__(self, path=MONITOR_FILE, persist_path=PERSIST_FILE):
+        self.path = path
+        self.persist_path = persist_path
+        self.version = 0
+        self._last = None
+        self._doc = None
+        self._persisted_at = 0.0
+        # Wersja rośnie także przez restart - klienci SSE porównują ją z poprzednią
+        for candidate in (path, persist_path):
+            try:
+                with open(candidate, 'r') as f: self.version = int(json.load(f).get("version", 0))
+                break
+            except (OSError, ValueError, AttributeError, TypeError): pass
+
+    def publish(self, employees):
+        # Zwraca True, jeśli powstała nowa wersja
+        body = json.dumps(employees, ensure_ascii=False, separators=(",", ":"))
+        if body == self._last: return False
+        self.version += 1
+        doc = f'{{"version":{self.version},"generated_at":{time.time():.3f},"employees":{body}}}'
+        atomic_write(self.path, doc.encode("utf-8"))
+        self._last, self._doc = body, doc
+        if time.monotonic() - self._persisted_at >= PERSIST_EVERY: self.persist()
+        return True
+
+    def persist(self):
+        # Kopia ostatniej wersji w /data (wywoływane z publish() i przy zatrzymaniu)
+        if not self.persist_path or self._doc is None: return
+        atomic_write(self.persist_path, self._doc.encode("utf-8"))
+        self._persisted_at = time.monotonic()
+
+
+class SnapshotReader:
+    def __init__(self, path=MONITOR_FILE, fallback=PERSIST_FILE):
+        self.path = path
+        self.fallback = fallback  # kopia z /data, dopóki proces logiki nie opublikuje pierwszego ticku
+        self.restored = False
+        self._sig = None
+        self._lock = threading.Lock()
+        self.version = 0
+        self.generated_at = None
+        self.employees = []
+        self.employees_json = b"[]"
+
+    def refresh(self):
+        path = self.path
+        try: st = os.stat(path)
+        except OSError:
+            if not self.fallback: return self
+            path = self.fallback
+            try: st = os.stat(path)
+            except OSError: return self
+        sig = (st.st_mtime_ns, st.st_ino)
+        if sig == self._sig: return self
+        with self._lock:
+            if sig == self._sig: return self
+            try:
+                with open(path, 'rb') as f: doc = json.loads(f.read())
+            except (OSError, ValueError):
+                return self
+            self.restored = path != self.path
+            self.employees = doc.get("employees", [])
+            self.employees_json = json.dumps(self.employees, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+            self.version = doc.get("version", 0)
+            self.generated_at = doc.get("generated_at")
+            self._sig = sig
+        return self
+
+
+def diff_employees(old, new):
+    # Różnice per pracownik: tylko zmienione pola; dodani w całości, usunięci po imieniu
+    old_by = {e["name"]: e for e in old}
+    changed = []
+    for e in new:
+        prev = old_by.get(e["name"])
+        if prev is None:
+            changed.append(e)
+            continue
+        patch = {k: v for k, v in e.items() if k != "name" and prev.get(k) != v}
+        if patch: changed.append(dict(patch, name=e["name"]))
+    new_names = {e["name"] for e in new}
+    removed = [n for n in old_by if n not in new_names]
+    order = [e["name"] for e in new] if [e["name"] for e in old] != [e["name"] for e in new] else None
+    return {"changed": changed, "removed": removed, "order": order}
+
+
+class SnapshotBroadcaster:
+    # Jeden wątek na proces obserwuje snapshot i rozsyła różnice do kolejek klientów SSE,
+    # więc diff liczony jest raz na wersję, a nie raz na klienta.
+    def __init__(self, reader, poll=0.5, queue_size=64):
+        self.reader = reader
+        self.poll = poll
+        self.queue_size = queue_size
+        self._subs = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self):
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subs.add(q)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, q):
+        with self._lock: self._subs.discard(q)
+
+    def _run(self):
+        snap = self.reader.refresh()
+        version, employees = snap.version, snap.employees
+        while True:
+            time.sleep(self.poll)
+            snap = self.reader.refresh()
+            if snap.version == version: continue
+            diff = diff_employees(employees, snap.employees)
+            version, employees = snap.version, snap.employees
+            if not (diff["changed"] or diff["removed"] or diff["order"]): continue
+            diff["version"] = version
+            with self._lock: subs = list(self._subs)
+            for q in subs:
+                try: q.put_nowait(diff)
+                except queue.Full:
+                    # Klient nie nadąża - dostanie pełny snapshot zamiast zgubionych różnic
+                    with q.mutex: q.queue.clear()
+                    q.put_nowait({"resync": True, "version": version})
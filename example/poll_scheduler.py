@@ -0,0 +1,106 @@
+import heapq
+import itertools
+from collections import deque
+
+# --- HARMONOGRAM ODPYTYWANIA SENSORÓW (tryb awaryjny bez WebSocketu) ---
+# Kolejka priorytetowa (heapq) terminów per sensor zamiast odpytywania wszystkiego co tick.
+# Sensory decydujące o statusie (moc W/kW, binary_sensor) są czytane często, pozostałe
+# (temperatura, wilgotność, ciśnienie...) rzadko, a niedostępne z wykładniczym odstępem.
+
+POLL_FAST = 10          # sekundy: sensory decydujące o is_working
+POLL_SLOW = 60          # sekundy: sensory środowiskowe (tylko kopie i monitor)
+POLL_BACKOFF_MAX = 300  # sekundy: górny limit odstępu dla niedostępnych encji
+RATE_WINDOW = 60        # sekundy: okno pomiaru faktycznej liczby zapytań
+# Od tylu zaległych sensorów jeden GET /states (filtrowany lokalnie) jest tańszy niż
+# zapytania per sensor - sekwencyjne odczyty przy setkach sensorów nie mieszczą się w ticku
+BULK_READ_MIN = 8
+
+DRIVING_UNITS = ("W", "kW")
+UNAVAILABLE = ("unavailable", "unknown", "None")
+
+
+def base_interval(entity_id, state):
+    if entity_id.startswith("binary_sensor."): return POLL_FAST
+    # Jednostkę znamy dopiero po pierwszym odczycie - do tego czasu traktujemy sensor jak szybki
+    if state is None: return POLL_FAST
+    if state.get("attributes", {}).get("unit_of_measurement") in DRIVING_UNITS: return POLL_FAST
+    return POLL_SLOW
+
+
+class PollScheduler:
+    def __init__(self):
+        self._heap = []      # (termin, nr, entity_id); wpisy nieaktualne pomijane przy zdejmowaniu
+        self._entries = {}   # entity_id -> {"due", "interval", "failures", "state"}
+        self._seq = itertools.count()
+        self._polls = deque()
+
+    def _push(self, entity_id, due):
+        self._entries[entity_id]["due"] = due
+        heapq.heappush(self._heap, (due, next(self._seq), entity_id))
+
+    def sync(self, entity_ids, now):
+        # Nowe sensory od razu do odczytu, usunięte z listy pracowników znikają z kolejki
+        wanted = set(entity_ids)
+        for eid in list(self._entries):
+            if eid not in wanted: del self._entries[eid]
+        for eid in wanted:
+            if eid not in self._entries:
+                self._entries[eid] = {"due": now, "interval": POLL_FAST, "failures": 0, "state": None, "read": False}
+                self._push(eid, now)
+
+    def clear(self):
+        self._heap.clear()
+        self._entries.clear()
+
+    def due(self, now):
+        out = []
+        while self._heap and self._heap[0][0] <= now:
+            due, _, eid = heapq.heappop(self._heap)
+            entry = self._entries.get(eid)
+            if entry is not None and entry["due"] == due: out.append(eid)
+        return out
+
+    def apply(self, entity_ids, results, now, bulk=False):
+        # results: entity_id -> stan (dict) albo None (404); brak klucza = zapytanie się nie udało.
+        # bulk - wyniki z jednego GET /states (jedno zapytanie w statystyce).
+        # Zwraca zbiór encji, których stan się zmienił.
+        changed = set()
+        for eid in entity_ids:
+            entry = self._entries.get(eid)
+            if entry is None: continue
+            if eid not in results:
+                # Błąd połączenia albo wyczerpany budżet ticku - spróbujemy w następnym
+                self._push(eid, now + POLL_FAST)
+                continue
+            if not bulk: self._polls.append(now)
+            state = results[eid]
+            entry["read"] = True
+            if state != entry["state"]: changed.add(eid)
+            entry["state"] = state
+            if state is None or state.get("state") in UNAVAILABLE:
+                entry["failures"] += 1
+                interval = min(POLL_BACKOFF_MAX, base_interval(eid, state) * 2 ** entry["failures"])
+            else:
+                entry["failures"] = 0
+                interval = base_interval(eid, state)
+            entry["interval"] = interval
+            self._push(eid, now + interval)
+        if bulk and results: self._polls.append(now)
+        return changed
+
+    def get(self, entity_id):
+        entry = self._entries.get(entity_id)
+        return entry["state"] if entry else None
+
+    def all_read(self):
+        # Każdy sensor z harmonogramu dostał choć jedną odpowiedź (także 404/unavailable)
+        return all(e["read"] for e in self._entries.values())
+
+    def snapshot(self):
+        return {eid: e["state"] for eid, e in self._entries.items() if e["state"] is not None}
+
+    def rate(self, now):
+        # (planowane, faktyczne) zapytania na minutę - do porównania z limitami proxy Supervisora
+        while self._polls and self._polls[0] < now - RATE_WINDOW: self._polls.popleft()
+        planned = sum(60.0 / e["interval"] for e in self._entries.values())
+        return planned, len(self._polls) * 60.0 / RATE_WINDOW
@@ -0,0 +1,171 @@
+import cProfile
+import itertools
+import json
+import os
+import re
+import threading
+import time
+
+from addon_options import DATA_DIR
+from atomic_file import atomic_write, file_lock, file_signature
+
+# --- PROFILOWANIE NA ŻĄDANIE (cProfile) ---
+# POST /api/profiles zapisuje w /data/profiles/requests.json zlecenie: "tick" albo
+# "route:/api/monitor" i liczbę przebiegów. Proces logiki i serwer WWW sprawdzają plik
+# najwyżej raz na sekundę (os.stat), więc bez zlecenia profilowanie nic nie kosztuje.
+# Wynik każdego przebiegu to plik .prof (pstats: snakeviz, gprof2dot, python -m pstats);
+# najstarsze pliki są usuwane po przekroczeniu limitu liczby lub rozmiaru.
+
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+MAX_FILES = 50
+MAX_BYTES = 50 * 1024 * 1024
+MAX_COUNT = 100       # maksymalna liczba przebiegów w jednym zleceniu
+CHECK_EVERY = 1.0     # sekundy: jak często sprawdzamy plik zleceń
+
+PROFILE_NAME_RE = re.compile(r"^[\w.-]+\.prof$")
+
+
+def _slug(target):
+    return re.sub(r"[^\w]+", "_", target).strip("_") or "root"
+
+
+class ProfileControl:
+    def __init__(self, directory=PROFILE_DIR):
+        self.directory = directory
+        self.request_file = os.path.join(directory, "requests.json")
+        self.lock_path = self.request_file + ".lock"
+        self._next_check = 0.0
+        self._sig = None
+        self._armed = False
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active = threading.Lock()  # cProfile: jeden aktywny profiler na proces
+
+    # --- ZLECENIA ---
+    def _read(self):
+        try:
+            with open(self.request_file, 'r') as f: return {k: int(v) for k, v in json.load(f).items() if int(v) > 0}
+        except (OSError, ValueError, AttributeError): return {}
+
+    def _write(self, data):
+        atomic_write(self.request_file, json.dumps(data).encode("utf-8"))
+
+    def _file_lock(self):
+        os.makedirs(self.directory, exist_ok=True)
+        return file_lock(self.lock_path)
+
+    def request(self, target, count):
+        with self._lock, self._file_lock():
+            data = self._read()
+            data[target] = min(MAX_COUNT, data.get(target, 0) + count)
+            self._write(data)
+            return dict(data)
+
+    def pending(self):
+        return self._read()
+
+    def _armed_now(self):
+        # Jedno os.stat() na sekundę - tyle kosztuje wyłączone profilowanie
+        now = time.monotonic()
+        if now < self._next_check: return self._armed
+        self._next_check = now + CHECK_EVERY
+        sig = file_signature(self.request_file)
+        if sig is None:
+            self._sig, self._armed = None, False
+            return False
+        if sig != self._sig:
+            self._sig = sig
+            self._armed = bool(self._read())
+        return self._armed
+
+    def claim(self, target):
+        if not self._armed_now(): return False
+        with self._lock, self._file_lock():
+            data = self._read()
+            if data.get(target, 0) <= 0: return False
+            data[target] -= 1
+            if not data[target]: del data[target]
+            self._write(data)
+            if not data: self._armed = False
+            return True
+
+    # --- PROFILOWANIE ---
+    def start(self, target):
+        if not self._armed_now() or not self._active.acquire(blocking=False): return None
+        try:
+            if not self.claim(target):
+                self._active.release()
+                return None
+            prof = cProfile.Profile()
+            prof.enable()
+            return prof
+        except Exception:
+            self._active.release()
+            raise
+
+    def stop(self, prof, target):
+        prof.disable()
+        try: self._save(prof, target)
+        except OSError as e: print(f"Błąd zapisu profilu {target}: {e}", flush=True)
+        finally: self._active.release()
+
+    def call(self, target, func, *args, **kwargs):
+        prof = self.start(target)
+        if prof is None: return func(*args, **kwargs)
+        try: return func(*args, **kwargs)
+        finally: self.stop(prof, target)
+
+    def _save(self, prof, target):
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{_slug(target)}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{next(self._seq)}.prof"
+        tmp = os.path.join(self.directory, "." + name)
+        prof.dump_stats(tmp)
+        os.replace(tmp, os.path.join(self.directory, name))
+        self._rotate()
+
+    def _rotate(self):
+        files = self.files()
+        total = sum(f["size"] for f in files)
+        for f in sorted(files, key=lambda f: f["mtime"]):
+            if len(files) <= MAX_FILES and total <= MAX_BYTES: break
+            try: os.unlink(os.path.join(self.directory, f["name"]))
+            except OSError: continue
+            files.remove(f)
+            total -= f["size"]
+
+    def files(self):
+        out = []
+        try: names = os.listdir(self.directory)
+        except OSError: return out
+        for name in names:
+            if not PROFILE_NAME_RE.match(name) or name.startswith("."): continue
+            try: st = os.stat(os.path.join(self.directory, name))
+            except OSError: continue
+            out.append({"name": name, "size": st.st_size, "mtime": st.st_mtime})
+        return sorted(out, key=lambda f: f["mtime"], reverse=True)
+
+    def path_for(self, name):
+        # Ścieżka do pliku profilu albo None (chroni przed ../ w nazwie)
+        if not PROFILE_NAME_RE.match(name) or name.startswith("."): return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+
+def instrument_flask(app, control):
+    from flask import g, request
+
+    @app.before_request
+    def _profile_start():
+        if request.url_rule is None: return
+        target = f"route:{request.url_rule.rule}"
+        prof = control.start(target)
+        if prof is not None: g.profile = (prof, target)
+
+    @app.teardown_request
+    def _profile_stop(exc):
+        # teardown działa także po wyjątku, więc profiler zawsze zostanie zwolniony
+        started = g.pop("profile", None)
+        if started is not None: control.stop(*started)
+
+
+PROFILES = ProfileControl()
@@ -1,7 +1,22 @@
 #!/usr/bin/with-contenv bashio
 
+# Metryki Prometheus obu procesów trafiają do wspólnego katalogu; czyścimy go przy każdym starcie
+export PROMETHEUS_MULTIPROC_DIR=/dev/shm/employee_metrics
+rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+
 echo "Uruchamiam logikę pracownika (Backend)..."
 python3 /employee_logic.py & 
 
-echo "Uruchamiam Gunicorn (Frontend)..."
-exec python3 -m gunicorn web_server:app --bind 0.0.0.0:8099 --workers 1 --log-level info
\ No newline at end of file
+WEB_WORKERS=$(bashio::config 'web_workers')
+WEB_WORKER_CLASS=$(bashio::config 'web_worker_class')
+WEB_THREADS=$(bashio::config 'web_threads')
+# Gunicorn przy --threads > 1 po cichu zamienia "sync" na gthread - sync oznacza jeden wątek
+if [ "${WEB_WORKER_CLASS}" = "sync" ]; then WEB_THREADS=1; fi
+# web_server.py sprawdza liczbę wątków: przy jednym /api/stream odsyła panel do odpytywania
+export WEB_WORKER_CLASS WEB_THREADS
+
+echo "Uruchamiam Gunicorn (Frontend): ${WEB_WORKERS} x ${WEB_WORKER_CLASS} (${WEB_THREADS} wątków)..."
+# gthread: każdy otwarty strumień /api/stream zajmuje jeden wątek, a nie cały proces
+exec python3 -m gunicorn web_server:app --config /gunicorn_conf.py --bind 0.0.0.0:8099 \
+    --workers "${WEB_WORKERS}" --worker-class "${WEB_WORKER_CLASS}" --threads "${WEB_THREADS}" --log-level info
\ No newline at end of file
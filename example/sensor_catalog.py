@@ -0,0 +1,144 @@
+import json
+import os
+import re
+import threading
+import time
+
+from atomic_file import atomic_write, file_lock, file_signature
+from monitor_snapshot import SHM_DIR
+
+# --- KATALOG SENSORÓW DLA STRONY GŁÓWNEJ ---
+# Przefiltrowana, opisana i posortowana lista sensorów liczona jest raz na zmianę,
+# a nie przy każdym wejściu na stronę. Czarna lista jest skompilowana do jednego
+# wyrażenia regularnego. Katalog wygasa po TTL albo wcześniej, gdy proces logiki
+# (subskrypcja entity_registry_updated) podbije plik generacji w /dev/shm.
+# Gotowy katalog leży też w /dev/shm, więc wszystkie workery gunicorna (i proces logiki)
+# korzystają z jednego przeliczenia; flock sprawia, że /states pobiera tylko jeden z nich.
+
+GENERATION_FILE = os.path.join(SHM_DIR, "employee_sensor_catalog.gen")
+CATALOG_FILE = os.path.join(SHM_DIR, "employee_sensor_catalog.json")
+CATALOG_TTL = 60  # sekundy: po tym czasie odświeżamy też same wartości stanów
+
+GLOBAL_BLACKLIST = [
+    "indicator", "light", "led", "display", "lock", "child", "physical control",
+    "filter", "life", "used time", "alarm", "error", "fault", "problem",
+    "update", "install", "version", "identify", "zidentyfikuj", "info",
+    "iphone", "ipad", "phone", "mobile", "router", "gateway", "brama"
+]
+
+PRETTY_NAMES = {
+    "temperature": "Temperatura", "humidity": "Wilgotność", "pressure": "Ciśnienie",
+    "power": "Moc", "energy": "Energia", "voltage": "Napięcie", "current": "Natężenie",
+    "battery": "Bateria", "signal_strength": "Sygnał", "pm25": "PM 2.5", "illuminance": "Jasność",
+    "connectivity": "Połączenie"
+}
+
+UNIT_LABELS = {"W": "Moc", "V": "Napięcie", "kWh": "Energia", "%": "Wilgotność"}
+
+ALLOWED_DOMAINS = ("sensor.", "binary_sensor.", "switch.", "light.")
+BLOCKED_PREFIXES = ("sensor.backup_", "sensor.sun_", "sensor.date", "sensor.time", "sensor.zone", "sensor.automation", "sensor.script", "update.", "person.", "zone.", "sun.", "todo.", "button.", "input_")
+BLOCKED_DEVICE_CLASSES = frozenset(["timestamp", "enum", "update", "date", "identify"])
+MANAGED_ENDINGS = ("_status", "_czas_pracy", "_czas_tydzien")
+
+# Jedno przejście po nazwie zamiast osobnego `in` dla każdego słowa z listy
+BLACKLIST_RE = re.compile("|".join(re.escape(w) for w in sorted(GLOBAL_BLACKLIST, key=len, reverse=True)))
+
+
+def is_candidate(eid, attrs, friendly_lower):
+    if not eid.startswith(ALLOWED_DOMAINS): return False
+    if attrs.get("managed_by") == "employee_manager": return False
+    if eid.endswith(MANAGED_ENDINGS): return False
+    if eid.startswith(BLOCKED_PREFIXES): return False
+    if attrs.get("device_class") in BLOCKED_DEVICE_CLASSES: return False
+    if BLACKLIST_RE.search(friendly_lower): return False
+    if " - " in friendly_lower and "status" in friendly_lower: return False
+    return True
+
+
+def build_catalog(states):
+    sensors = []
+    for entity in states:
+        eid = entity['entity_id']
+        attrs = entity.get("attributes", {})
+        friendly_name = attrs.get("friendly_name", eid)
+        if not is_candidate(eid, attrs, friendly_name.lower()): continue
+        device_class = attrs.get("device_class")
+        unit = attrs.get("unit_of_measurement", "")
+        main_label = PRETTY_NAMES.get(device_class) or UNIT_LABELS.get(unit) or friendly_name
+        sensors.append({
+            "id": eid,
+            "main_label": main_label,
+            "sub_label": friendly_name,
+            "unit": unit,
+            "state": entity.get("state", "-"),
+            "device_class": device_class
+        })
+    sensors.sort(key=lambda x: (x['main_label'], x['sub_label']))
+    return sensors
+
+
+def bump_generation(path=GENERATION_FILE):
+    # Wywoływane przez proces logiki po zmianie rejestru encji
+    try:
+        with open(path, 'w') as f: f.write(str(time.time_ns()))
+    except OSError: pass
+
+
+def _generation(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_ino)
+    except OSError:
+        return None
+
+
+class SensorCatalog:
+    def __init__(self, fetch_states, ttl=CATALOG_TTL, generation_file=GENERATION_FILE, path=CATALOG_FILE):
+        self.fetch_states = fetch_states  # callable -> lista stanów z /states albo None
+        self.ttl = ttl
+        self.generation_file = generation_file
+        self.path = path
+        self.lock_path = path + ".lock"
+        self._sensors = None
+        self._expires = 0.0    # time.time(): termin jest wspólny dla wszystkich procesów
+        self._generation = None
+        self._stat = None
+        self._lock = threading.Lock()
+
+    def _fresh(self):
+        return (self._sensors is not None and time.time() < self._expires
+                and _generation(self.generation_file) == self._generation)
+
+    def _load_shared(self):
+        # Katalog policzony przez inny proces; czytany ponownie tylko po zmianie pliku
+        sig = file_signature(self.path)
+        if sig is None or sig == self._stat: return
+        try:
+            with open(self.path, 'r') as f: data = json.load(f)
+        except (OSError, ValueError): return
+        self._stat = sig
+        self._sensors = data["sensors"]
+        self._expires = data["expires"]
+        self._generation = tuple(data["generation"]) if data["generation"] else None
+
+    def get(self):
+        # Zwraca (lista sensorów, True jeśli bez zapytania do HA)
+        if self._fresh(): return self._sensors, True
+        # Jedno przeliczenie naraz - pozostałe wątki i workery czekają na jego wynik
+        with self._lock, file_lock(self.lock_path):
+            self._load_shared()
+            if self._fresh(): return self._sensors, True
+            generation = _generation(self.generation_file)
+            states = self.fetch_states()
+            if states is None:
+                # HA niedostępne: oddajemy ostatni katalog, następne wejście spróbuje ponownie
+                return self._sensors or [], False
+            self._sensors = build_catalog(states)
+            self._generation = generation
+            self._expires = time.time() + self.ttl
+            try:
+                atomic_write(self.path, json.dumps({"generation": generation, "expires": self._expires,
+                                                     "sensors": self._sensors}, ensure_ascii=False).encode("utf-8"))
+                self._stat = None
+            except OSError as e: print(f"Błąd zapisu katalogu sensorów: {e}", flush=True)
+            return self._sensors, False
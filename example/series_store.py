@@ -0,0 +1,201 @@
+import math
+import os
+import sqlite3
+import time
+from array import array
+
+from history_store import connect
+
+# --- SZEREGI CZASOWE KOPII SENSORÓW (wykresy w karcie) ---
+# Dla każdej kopii sensora (sensor.jan_moc, sensor.jan_temperatura...) trzy bufory
+# pierścieniowe o stałym rozmiarze (array float32): surowe próbki z ticku przez 1 h,
+# średnie minutowe przez 24 h i 15-minutowe przez 30 dni. Każda próbka trafia do
+# wszystkich poziomów naraz - bieżący kubełek trzyma sumę i liczbę próbek, więc średnia
+# jest zawsze aktualna. Poziomy są zapisywane w SQLite, każdy z własną częstotliwością,
+# a /api/series/<pracownik> czyta je bez pytania HA o historię. Bufor leży w bazie jako
+# kawałki po CHUNK kubełków (series_chunks) - zapis obejmuje tylko kawałki zmienione od
+# poprzedniego zapisu, a nie cały blob poziomu (karta SD).
+
+# (nazwa, krok w sekundach, liczba kubełków, co ile sekund zapis do bazy)
+TIERS = (
+    ("raw", 10, 360, 300),
+    ("1m", 60, 1440, 600),
+    ("15m", 900, 2880, 900),
+)
+TIER_BY_NAME = {t[0]: t for t in TIERS}
+RANGES = {"1h": "raw", "24h": "1m", "30d": "15m"}
+CHUNK = 64  # kubełków (256 B float32) w jednym wierszu series_chunks
+NAN = float("nan")
+
+
+class Ring:
+    __slots__ = ("step", "capacity", "values", "head", "acc_sum", "acc_n", "dirty")
+
+    def __init__(self, step, capacity, head=None, acc_sum=0.0, acc_n=0):
+        self.step = step
+        self.capacity = capacity
+        self.values = array('f', [NAN]) * capacity
+        self.head = head       # numer kubełka (czas // krok) ostatniej próbki
+        self.acc_sum = acc_sum
+        self.acc_n = acc_n
+        self.dirty = set()     # numery kawałków zmienionych od ostatniego zapisu
+
+    def _set(self, index, value):
+        self.values[index] = value
+        self.dirty.add(index // CHUNK)
+
+    def load_chunk(self, chunk, data):
+        part = array('f')
+        part.frombytes(data)
+        start = chunk * CHUNK
+        if start + len(part) <= self.capacity: self.values[start:start + len(part)] = part
+
+    def chunk_bytes(self, chunk):
+        return self.values[chunk * CHUNK:(chunk + 1) * CHUNK].tobytes()
+
+    def add(self, ts, value):
+        bucket = int(ts // self.step)
+        if self.head is None or bucket > self.head:
+            # Kubełki bez próbek (przerwa w pracy dodatku) czyścimy, żeby nie pokazać danych sprzed doby
+            if self.head is not None:
+                for b in range(self.head + 1, min(bucket, self.head + self.capacity) + 1):
+                    self._set(b % self.capacity, NAN)
+            self.head, self.acc_sum, self.acc_n = bucket, 0.0, 0
+        elif bucket < self.head: return  # zegar cofnięty - próbkę pomijamy
+        self.acc_sum += value
+        self.acc_n += 1
+        self._set(bucket % self.capacity, self.acc_sum / self.acc_n)
+
+    def window(self, now):
+        # (czas początku, lista wartości od najstarszej) dla ostatnich `capacity` kubełków do `now`
+        end = int(now // self.step)
+        if self.head is not None: end = max(end, self.head)
+        start = end - self.capacity + 1
+        out = []
+        for b in range(start, end + 1):
+            v = NAN if self.head is None or b > self.head or b <= self.head - self.capacity else self.values[b % self.capacity]
+            out.append(None if math.isnan(v) else v)
+        return start * self.step, out
+
+
+def downsample(values, points):
+    # Średnie z równych grup - do wykresu w karcie wystarczy kilkadziesiąt punktów
+    if not points or points >= len(values): return values, 1
+    group = math.ceil(len(values) / points)
+    out = []
+    for i in range(0, len(values), group):
+        chunk = [v for v in values[i:i + group] if v is not None]
+        out.append(sum(chunk) / len(chunk) if chunk else None)
+    return out, group
+
+
+class SeriesStore:
+    def __init__(self, conn):
+        self.conn = conn  # połączenie HistoryWriter - zapis w tym samym wątku co flush()
+        with self.conn:
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS series_meta
+                         (entity_id TEXT, tier TEXT, employee_name TEXT, unit TEXT,
+                         head INTEGER, acc_sum REAL, acc_n INTEGER,
+                         PRIMARY KEY (entity_id, tier))''')
+            self.conn.execute("CREATE INDEX IF NOT EXISTS idx_series_meta_employee ON series_meta (employee_name, tier)")
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS series_chunks
+                         (entity_id TEXT, tier TEXT, chunk INTEGER, data BLOB,
+                         PRIMARY KEY (entity_id, tier, chunk))''')
+        self._series = {}  # entity_id -> {"employee", "unit", "rings": {poziom: Ring}, "dirty": set, "saved": {poziom: ts}}
+        now = time.time()
+        for eid, tier, emp, unit, head, acc_sum, acc_n in self.conn.execute(
+                "SELECT entity_id, tier, employee_name, unit, head, acc_sum, acc_n FROM series_meta"):
+            if tier not in TIER_BY_NAME: continue
+            s = self._get(eid, emp, unit)
+            _, step, capacity, _ = TIER_BY_NAME[tier]
+            s["rings"][tier] = Ring(step, capacity, head, acc_sum, acc_n)
+            s["saved"][tier] = now
+        for eid, tier, chunk, data in self.conn.execute("SELECT entity_id, tier, chunk, data FROM series_chunks"):
+            ring = self._series.get(eid, {}).get("rings", {}).get(tier)
+            if ring is not None: ring.load_chunk(chunk, data)
+
+    def _get(self, entity_id, employee, unit):
+        s = self._series.get(entity_id)
+        if s is None:
+            s = self._series[entity_id] = {
+                "employee": employee, "unit": unit, "dirty": set(), "saved": {},
+                "rings": {name: Ring(step, capacity) for name, step, capacity, _ in TIERS}}
+        return s
+
+    def add(self, entity_id, employee, unit, ts, value):
+        try: value = float(value)
+        except (TypeError, ValueError): return
+        if math.isnan(value) or math.isinf(value): return
+        s = self._get(entity_id, employee, unit)
+        s["employee"], s["unit"] = employee, unit
+        for name, ring in s["rings"].items():
+            ring.add(ts, value)
+            s["dirty"].add(name)
+
+    def retain(self, roster, removed=()):
+        # Szeregi znikają z pamięci i bazy tylko po usunięciu pracownika z listy (roster) albo
+        # sensora z jego listy (removed - kopie skasowane przez sprzątanie), nigdy dlatego,
+        # że sensor był przez chwilę niedostępny
+        gone = [eid for eid, s in self._series.items() if s["employee"] not in roster or eid in removed]
+        for eid in gone: del self._series[eid]
+        if gone:
+            with self.conn:
+                self.conn.executemany("DELETE FROM series_meta WHERE entity_id = ?", [(eid,) for eid in gone])
+                self.conn.executemany("DELETE FROM series_chunks WHERE entity_id = ?", [(eid,) for eid in gone])
+        return gone
+
+    def save(self, now, force=False):
+        # Zapis zmienionych poziomów, każdy najwyżej raz na swój interwał (force - przy wyłączaniu);
+        # z bufora tylko kawałki zmienione od poprzedniego zapisu
+        meta, chunks = [], []
+        for eid, s in self._series.items():
+            for name in list(s["dirty"]):
+                if not force and now - s["saved"].get(name, 0.0) < TIER_BY_NAME[name][3]: continue
+                ring = s["rings"][name]
+                meta.append((eid, name, s["employee"], s["unit"], ring.head, ring.acc_sum, ring.acc_n))
+                chunks.extend((eid, name, c, sqlite3.Binary(ring.chunk_bytes(c))) for c in sorted(ring.dirty))
+                ring.dirty.clear()
+                s["dirty"].discard(name)
+                s["saved"][name] = now
+        if meta:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO series_meta (entity_id, tier, employee_name, unit, head, acc_sum, acc_n) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", meta)
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO series_chunks (entity_id, tier, chunk, data) VALUES (?, ?, ?, ?)", chunks)
+        return len(meta)
+
+
+def query_series(db_file, employee, range_name="24h", points=None, now=None):
+    # Szeregi wszystkich kopii sensorów pracownika z jednego poziomu; None = brak próbki
+    if range_name not in RANGES: raise ValueError(f"Nieznany zakres: {range_name}")
+    if points is not None: points = max(2, min(int(points), 2880))
+    tier = RANGES[range_name]
+    _, step, capacity, _ = TIER_BY_NAME[tier]
+    now = time.time() if now is None else now
+    out = {"employee": employee, "range": range_name, "sensors": []}
+
+    if not os.path.exists(db_file): return out
+    conn = connect(db_file, readonly=True)
+    try:
+        rows = conn.execute(
+            "SELECT entity_id, unit, head, acc_sum, acc_n FROM series_meta WHERE employee_name = ? AND tier = ? "
+            "ORDER BY entity_id", (employee, tier)).fetchall()
+        chunks = conn.execute(
+            "SELECT c.entity_id, c.chunk, c.data FROM series_chunks c JOIN series_meta m USING (entity_id, tier) "
+            "WHERE m.employee_name = ? AND m.tier = ?", (employee, tier)).fetchall()
+    except sqlite3.OperationalError:
+        # Baza bez tabeli szeregów (proces logiki jeszcze jej nie założył)
+        return out
+    finally:
+        conn.close()
+    rings = {eid: Ring(step, capacity, head, acc_sum, acc_n) for eid, unit, head, acc_sum, acc_n in rows}
+    for eid, chunk, data in chunks: rings[eid].load_chunk(chunk, data)
+    for eid, unit, head, acc_sum, acc_n in rows:
+        start, values = rings[eid].window(now)
+        values, group = downsample(values, points)
+        out["sensors"].append({
+            "entity_id": eid, "unit": unit, "start": start, "step": step * group,
+            "values": [None if v is None else round(v, 2) for v in values]})
+    return out
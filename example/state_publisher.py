@@ -0,0 +1,84 @@
+import contextvars
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# --- PUBLIKACJA STANÓW DO HA TYLKO PRZY ZMIANIE ---
+# Pamięta ostatni stan + atrybuty wysłane dla każdej encji. Niezmienione zapisy
+# są pomijane, a pozostałe wysyłane równolegle przez jedną, ograniczoną pulę wątków.
+# Nieudany zapis zostaje w kolejce i idzie ponownie przy następnym flush() - kopia
+# sensora, którego wartość się nie zmienia, nie jest ponownie kolejkowana przez tick.
+
+
+class StatePublisher:
+    def __init__(self, post, workers=8):
+        self.post = post  # callable(entity_id, payload) -> True gdy HA przyjął zapis
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="publisher")
+        self._last = {}
+        self._pending = {}
+        self._skipped = 0
+        self._lock = threading.Lock()
+        self.last_stats = {"sent": 0, "skipped": 0, "failed": 0}
+
+    def queue(self, entity_id, state, attributes):
+        payload = {"state": str(state), "attributes": attributes}
+        key = json.dumps(payload, sort_keys=True)
+        with self._lock:
+            if self._last.get(entity_id) == key and entity_id not in self._pending:
+                self._skipped += 1
+                return
+            self._pending[entity_id] = (payload, key)
+
+    def forget(self, entity_id):
+        # Encja usunięta w HA (albo zniknęła po restarcie) - następny zapis musi pójść
+        with self._lock: self._last.pop(entity_id, None)
+
+    def discard(self, entity_id):
+        # Encja kasowana przez nas - czekający (np. nieudany) zapis nie może jej odtworzyć
+        with self._lock:
+            self._last.pop(entity_id, None)
+            self._pending.pop(entity_id, None)
+
+    def known(self):
+        with self._lock: return set(self._last)
+
+    def take_pending(self):
+        # Zabiera zapisy do wysłania: {entity_id: (payload, klucz)}; wynik trzeba oddać przez settle()
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+        return pending
+
+    def settle(self, pending, results):
+        # results: {entity_id: True/False}; brak wpisu = zapis nie doszedł (np. przerwany terminem)
+        sent = failed = 0
+        with self._lock:
+            for eid, (payload, key) in pending.items():
+                if results.get(eid):
+                    self._last[eid] = key
+                    sent += 1
+                else:
+                    # Ponowna próba przy następnym flush(), chyba że w międzyczasie przyszła nowsza wartość
+                    self._last.pop(eid, None)
+                    self._pending.setdefault(eid, (payload, key))
+                    failed += 1
+        return sent, failed
+
+    def take_skipped(self):
+        with self._lock:
+            skipped, self._skipped = self._skipped, 0
+        return skipped
+
+    def flush(self):
+        pending = self.take_pending()
+        # copy_context() przenosi do wątków puli kontekst wywołującego (np. budżet czasu ticku)
+        futures = {self._pool.submit(contextvars.copy_context().run, self.post, eid, payload): eid
+                   for eid, (payload, key) in pending.items()}
+        wait(futures)
+        results = {}
+        for fut, eid in futures.items():
+            try: results[eid] = bool(fut.result())
+            except Exception: results[eid] = False
+        sent, failed = self.settle(pending, results)
+        self.last_stats = {"sent": sent, "skipped": self.take_skipped(), "failed": failed}
+        return self.last_stats
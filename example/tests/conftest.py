@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Moduły dodatku leżą płasko w example/ (w kontenerze w /) - importujemy je bez pakietu
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,102 @@
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from history_store import HistoryWriter, day_of, next_midnight
+
+
+def ts(day, hour, minute=0):
+    return datetime.strptime(f"{day} {hour:02d}:{minute:02d}", "%Y-%m-%d %H:%M").timestamp()
+
+
+def stored(db_file, work_date, name):
+    conn = sqlite3.connect(db_file)
+    try:
+        row = conn.execute("SELECT minutes_worked FROM work_history WHERE work_date = ? AND employee_name = ?",
+                           (work_date, name)).fetchone()
+    finally:
+        conn.close()
+    return row[0] if row else None
+
+
+@pytest.fixture
+def today():
+    return datetime.now().strftime("%Y-%m-%d")
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    return str(tmp_path / "history.db")
+
+
+def test_session_minutes_follow_wall_clock(db_file, today):
+    h = HistoryWriter(db_file)
+    start = ts(today, 0, 5)
+    h.track("Jan", True, start)
+    h.track("Jan", True, start + 600)  # kolejne ticki nie zaczynają nowej sesji
+    assert h.minutes(today, "Jan", start + 900) == pytest.approx(15)
+    h.track("Jan", False, start + 1200)
+    h.track("Jan", True, start + 1800)
+    h.flush(start + 2400)
+    assert h.minutes(today, "Jan", start + 2400) == pytest.approx(30)
+    assert stored(db_file, today, "Jan") == 30
+
+
+def test_split_days_cuts_session_at_midnight(db_file):
+    day = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+    midnight = next_midnight(day)
+    next_day = day_of(midnight)
+    h = HistoryWriter(db_file)
+    h.track("Jan", True, midnight - 1800)
+    h.split_days(midnight + 600)
+    h.flush(midnight + 600)
+    assert h.minutes(day, "Jan", midnight + 600) == pytest.approx(30)
+    assert h.minutes(next_day, "Jan", midnight + 600) == pytest.approx(10)
+    assert stored(db_file, day, "Jan") == 30
+    assert stored(db_file, next_day, "Jan") == 10
+
+
+def test_restart_mid_day_keeps_open_session_until_last_seen(db_file, today):
+    h = HistoryWriter(db_file)
+    start = ts(today, 0, 10)
+    h.track("Jan", True, start)
+    h.flush(start + 1200)
+    h.conn.close()  # awaria: sesja bez końca, ostatni znak życia po 20 min
+
+    h = HistoryWriter(db_file)
+    assert h.minutes(today, "Jan", start + 3600) == pytest.approx(20)
+    h.track("Jan", True, start + 3600)
+    h.flush(start + 4200)
+    assert stored(db_file, today, "Jan") == 30
+
+
+def test_restart_mid_day_keeps_minutes_stored_before_sessions(db_file, today):
+    # Baza sprzed sesji (albo z utraconymi sesjami): 240 min dzisiaj tylko w work_history
+    h = HistoryWriter(db_file)
+    with h.conn:
+        h.conn.execute("INSERT INTO work_history (work_date, employee_name, minutes_worked) VALUES (?, 'Jan', 240)", (today,))
+    h.conn.close()
+
+    h = HistoryWriter(db_file)
+    start = ts(today, 0, 30)
+    h.track("Jan", True, start)
+    h.flush(start + 60)
+    assert stored(db_file, today, "Jan") == 241
+    assert h.conn.execute("SELECT minutes FROM work_rollups WHERE period = 'month' AND employee_name = 'Jan'").fetchone()[0] == 241
+
+
+def test_restore_day_takes_journal_counter_when_db_is_behind(db_file, today):
+    h = HistoryWriter(db_file)
+    h.restore_day(today, {"Jan": 90.4, "Ewa": 0})
+    h.flush(ts(today, 0, 1))
+    assert stored(db_file, today, "Jan") == 90
+    assert stored(db_file, today, "Ewa") is None  # zero nie tworzy wiersza
+    h.conn.close()
+
+    # Kolejny restart z tym samym licznikiem niczego nie dokłada
+    h = HistoryWriter(db_file)
+    h.restore_day(today, {"Jan": 90.4})
+    assert h.minutes(today, "Jan", ts(today, 0, 2)) == pytest.approx(90.4)
+    h.flush(ts(today, 0, 2))
+    assert stored(db_file, today, "Jan") == 90
@@ -0,0 +1,131 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from history_store import DAILY_TARGET_MINUTES, ROLLUP_KEY_SQL, HistoryWriter, period_key, query_stats
+
+
+def upsert(conn, work_date, name, minutes):
+    # To samo polecenie co HistoryWriter.flush()
+    with conn:
+        conn.execute(
+            "INSERT INTO work_history (work_date, employee_name, minutes_worked) VALUES (?, ?, ?) "
+            "ON CONFLICT(work_date, employee_name) DO UPDATE SET minutes_worked = excluded.minutes_worked "
+            "WHERE work_history.minutes_worked IS NOT excluded.minutes_worked",
+            (work_date, name, minutes))
+
+
+def rollup(conn, period, key, name):
+    return conn.execute(
+        "SELECT minutes, days, days_over_target FROM work_rollups WHERE period = ? AND period_key = ? AND employee_name = ?",
+        (period, key, name)).fetchone()
+
+
+def rollups(conn):
+    # Wiersze zerowe zostają po usunięciu dni - pełne przeliczenie ich nie tworzy
+    return sorted(conn.execute("SELECT * FROM work_rollups WHERE minutes != 0 OR days != 0 OR days_over_target != 0"))
+
+
+@pytest.fixture
+def writer(tmp_path):
+    h = HistoryWriter(str(tmp_path / "history.db"))
+    yield h
+    h.conn.close()
+
+
+def test_week_keys_match_isocalendar(writer):
+    first, last = date(2015, 1, 1), date(2034, 12, 31)
+    rows = writer.conn.execute(
+        "WITH RECURSIVE days(d) AS (SELECT ? UNION ALL SELECT date(d, '+1 day') FROM days WHERE d < ?) "
+        f"SELECT d, {ROLLUP_KEY_SQL['week'].format(d='d')} FROM days", (first.isoformat(), last.isoformat())).fetchall()
+    assert len(rows) == (last - first).days + 1
+    assert [k for _, k in rows] == [period_key("week", d) for d, _ in rows]
+
+
+@pytest.mark.parametrize("work_date, week, month, year", [
+    ("2026-12-31", "2026-W53", "2026-12", "2026"),
+    ("2027-01-03", "2026-W53", "2027-01", "2027"),
+    ("2027-01-04", "2027-W01", "2027-01", "2027"),
+    ("2024-12-30", "2025-W01", "2024-12", "2024"),
+    ("2024-02-29", "2024-W09", "2024-02", "2024"),
+])
+def test_period_keys_across_year_boundaries(writer, work_date, week, month, year):
+    assert (period_key("week", work_date), period_key("month", work_date), period_key("year", work_date)) == (week, month, year)
+    sql = ", ".join(ROLLUP_KEY_SQL[p].format(d=":d") for p in ("week", "month", "year"))
+    assert writer.conn.execute(f"SELECT {sql}", {"d": work_date}).fetchone() == (week, month, year)
+
+
+def test_triggers_apply_insert_update_delete_deltas(writer):
+    conn = writer.conn
+    upsert(conn, "2026-12-31", "Jan", DAILY_TARGET_MINUTES + 20)
+    upsert(conn, "2027-01-01", "Jan", 300)
+    assert rollup(conn, "week", "2026-W53", "Jan") == (DAILY_TARGET_MINUTES + 320, 2, 1)
+    assert rollup(conn, "month", "2026-12", "Jan") == (DAILY_TARGET_MINUTES + 20, 1, 1)
+    assert rollup(conn, "month", "2027-01", "Jan") == (300, 1, 0)
+    assert rollup(conn, "year", "2027", "Jan") == (300, 1, 0)
+
+    upsert(conn, "2027-01-01", "Jan", DAILY_TARGET_MINUTES)  # dzień przekracza cel
+    assert rollup(conn, "week", "2026-W53", "Jan") == (2 * DAILY_TARGET_MINUTES + 20, 2, 2)
+    upsert(conn, "2026-12-31", "Jan", 0)
+    assert rollup(conn, "week", "2026-W53", "Jan") == (DAILY_TARGET_MINUTES, 1, 1)
+    assert rollup(conn, "year", "2026", "Jan") == (0, 0, 0)
+
+    with conn: conn.execute("DELETE FROM work_history WHERE work_date = '2027-01-01'")
+    assert rollup(conn, "week", "2026-W53", "Jan") == (0, 0, 0)
+    assert rollup(conn, "month", "2027-01", "Jan") == (0, 0, 0)
+
+
+def test_unchanged_minutes_do_not_touch_rollups(writer):
+    conn = writer.conn
+    upsert(conn, "2026-10-12", "Jan", 100)
+    changes = conn.total_changes
+    upsert(conn, "2026-10-12", "Jan", 100)
+    assert conn.total_changes == changes
+    assert rollup(conn, "week", "2026-W42", "Jan") == (100, 1, 0)
+
+
+def test_rebuild_matches_incremental(writer):
+    conn = writer.conn
+    rnd = random.Random(7)
+    start = date(2025, 12, 1)
+    for _ in range(400):
+        d = (start + timedelta(days=rnd.randrange(120))).isoformat()
+        name = rnd.choice(("Jan", "Anna", "Piotr"))
+        if rnd.random() < 0.1:
+            with conn: conn.execute("DELETE FROM work_history WHERE work_date = ? AND employee_name = ?", (d, name))
+        else:
+            upsert(conn, d, name, rnd.choice((0, rnd.randrange(1, 700))))
+    incremental = rollups(conn)
+    with conn: writer.rebuild_rollups()
+    assert rollups(conn) == incremental
+
+
+def test_week_before_excludes_the_day_itself(writer):
+    conn = writer.conn
+    upsert(conn, "2026-10-12", "Jan", 100)  # poniedziałek
+    upsert(conn, "2026-10-13", "Jan", 200)
+    upsert(conn, "2026-10-11", "Jan", 50)   # niedziela poprzedniego tygodnia
+    assert writer.week_before("2026-10-13") == {"Jan": 100}
+    assert writer.week_before("2026-10-14") == {"Jan": 300}
+
+
+def test_query_stats_pages_periods_newest_first(writer, tmp_path):
+    conn = writer.conn
+    for d, m in (("2026-09-30", 480), ("2026-10-01", 240), ("2026-10-02", 500), ("2026-11-02", 60)):
+        upsert(conn, d, "Jan", m)
+    upsert(conn, "2026-10-05", "Anna", 600)
+    db_file = str(tmp_path / "history.db")
+
+    stats = query_stats(db_file, "month", limit=2)
+    assert [p["period_key"] for p in stats["periods"]] == ["2026-11", "2026-10"]
+    october = stats["periods"][1]["employees"]
+    assert [e["name"] for e in october] == ["Anna", "Jan"]
+    assert october[1] == {"name": "Jan", "minutes": 740, "hours": 12.33, "days": 2, "avg_minutes": 370.0,
+                          "days_over_target": 1}
+
+    stats = query_stats(db_file, "week", date_from="2026-10-01", date_to="2026-10-04", employee="Jan")
+    assert [(p["period_key"], p["employees"][0]["minutes"]) for p in stats["periods"]] == [("2026-W40", 1220)]
+
+    with pytest.raises(ValueError): query_stats(db_file, "day")
+    assert query_stats(str(tmp_path / "missing.db"))["periods"] == []
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# --- BENCHMARK OFFLINE (stub HA + ticki pętli logiki + endpointy WWW) ---
+# Dla każdego rozmiaru listy pracowników uruchamia tools/ha_stub.py i osobny proces,
+# który wykonuje --ticks ticków LogicLoop oraz zapytania do /api/monitor i /.
+# Wynik (JSON) nadaje się do porównywania między wersjami:
+#
+#   python3 tools/bench.py --employees 10,100,1000 --sensors 3 --latency 0.005 -o wynik.json
+#   python3 tools/bench.py --engine asyncio --no-websocket
+#
+# Mierzone: czas ticku (percentyle), zapytania HTTP na tick, zapisy SQLite na tick,
+# czasy /api/monitor i /, szczytowe RSS procesu z logiką.
+import argparse
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB = os.path.join(ROOT, "tools", "ha_stub.py")
+
+
+def percentiles(values, points=(50, 90, 99)):
+    if not values: return {}
+    ordered = sorted(values)
+    out = {f"p{p}": round(ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))], 3) for p in points}
+    out["max"] = round(ordered[-1], 3)
+    out["mean"] = round(sum(ordered) / len(ordered), 3)
+    return out
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_http(url, timeout=10):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        try:
+            with urllib.request.urlopen(url, timeout=1): return
+        except OSError: time.sleep(0.1)
+    raise RuntimeError(f"Stub nie odpowiada: {url}")
+
+
+def roster(employees, sensors):
+    emps = []
+    extra = max(0, sensors - 2)
+    for i in range(employees):
+        ids = [f"sensor.gniazdko_{i}_power", f"sensor.czujnik_{i}_temperature"]
+        ids += [f"sensor.inny_{i * extra + k}" for k in range(extra)]
+        emps.append({"name": f"Pracownik {i}", "sensors": ids[:sensors], "threshold": "20"})
+    return emps
+
+
+# --- PROCES POMIARU (jeden scenariusz) ---
+def run_scenario(args):
+    # Importy dopiero tutaj: moduły dodatku czytają DATA_DIR/HA_API_URL przy imporcie
+    sys.path.insert(0, ROOT)
+    import employee_logic
+    import web_server
+    from ha_client import HA
+
+    loop = employee_logic.LogicLoop().start()
+    writes = {"rows": 0, "commits": 0}
+
+    def trace(sql):
+        head = sql.lstrip()[:6].upper()
+        if head in ("INSERT", "UPDATE", "DELETE"): writes["rows"] += 1
+        elif head == "COMMIT": writes["commits"] += 1
+    if employee_logic.HISTORY: employee_logic.HISTORY.conn.set_trace_callback(trace)
+
+    if not args.no_websocket:
+        end = time.monotonic() + 15
+        while not loop.stream.live and time.monotonic() < end: time.sleep(0.05)
+
+    def requests_total():
+        return HA.stats["requests"] + (loop.engine.stats["requests"] if loop.engine else 0)
+
+    ticks, reqs, sql_writes, sql_commits = [], [], [], []
+    first_tick_ms = None
+    for n in range(args.ticks + 1):
+        before_req, before_rows, before_commits = requests_total(), writes["rows"], writes["commits"]
+        t0 = time.perf_counter()
+        loop.tick()
+        ms = (time.perf_counter() - t0) * 1000
+        if n == 0:
+            # Pierwszy tick publikuje wszystko od zera - raportowany osobno
+            first_tick_ms = round(ms, 3)
+        else:
+            ticks.append(ms)
+            reqs.append(requests_total() - before_req)
+            sql_writes.append(writes["rows"] - before_rows)
+            sql_commits.append(writes["commits"] - before_commits)
+        time.sleep(args.tick_gap)
+
+    client = web_server.app.test_client()
+    timings = {"/api/monitor": [], "/": []}
+    catalog_hits = 0
+    for _ in range(args.web_requests):
+        for path, samples in timings.items():
+            t0 = time.perf_counter()
+            resp = client.get(path)
+            samples.append((time.perf_counter() - t0) * 1000)
+            if path == "/" and resp.headers.get("X-Sensor-Catalog") == "hit": catalog_hits += 1
+
+    return {
+        "employees": args.scenario,
+        "sensors_per_employee": args.sensors,
+        "engine": args.engine,
+        "websocket": not args.no_websocket,
+        "latency_s": args.latency,
+        "ticks": args.ticks,
+        "first_tick_ms": first_tick_ms,
+        "tick_ms": percentiles(ticks),
+        "requests_per_tick": percentiles(reqs),
+        "sqlite_writes_per_tick": percentiles(sql_writes),
+        "sqlite_commits_per_tick": percentiles(sql_commits),
+        "monitor_ms": percentiles(timings["/api/monitor"]),
+        "index_ms": percentiles(timings["/"]),
+        "index_catalog_hits": catalog_hits,
+        "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+# --- PROCES NADRZĘDNY ---
+def bench(args, employees):
+    port = free_port()
+    stub = subprocess.Popen(
+        [sys.executable, STUB, "--port", str(port), "--employees", str(employees),
+         "--extra", str(employees * max(0, args.sensors - 2) + args.extra),
+         "--interval", str(args.interval), "--changes", str(max(1, employees * args.churn // 100)),
+         "--latency", str(args.latency)],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_http(f"http://127.0.0.1:{port}/api/")
+        with tempfile.TemporaryDirectory(prefix="employee-bench-") as tmp:
+            with open(os.path.join(tmp, "employees.json"), "w") as f: json.dump(roster(employees, args.sensors), f)
+            with open(os.path.join(tmp, "options.json"), "w") as f:
+                json.dump({"ha_token": "bench", "engine": args.engine}, f)
+            env = {k: v for k, v in os.environ.items() if k != "SUPERVISOR_TOKEN"}
+            env.update(DATA_DIR=tmp, SHM_DIR=tmp, HA_API_URL=f"http://127.0.0.1:{port}/api",
+                       HA_WS_URL=f"ws://127.0.0.1:{free_port() if args.no_websocket else port}/api/websocket")
+            result_file = os.path.join(tmp, "result.json")
+            cmd = [sys.executable, os.path.abspath(__file__), "--scenario", str(employees), "--result-file", result_file]
+            cmd += sys.argv[1:]
+            subprocess.run(cmd, env=env, cwd=ROOT, check=True,
+                           stdout=None if args.verbose else subprocess.DEVNULL,
+                           stderr=None if args.verbose else subprocess.DEVNULL)
+            with open(result_file) as f: return json.load(f)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmark offline dodatku (stub HA)")
+    ap.add_argument("--employees", default="10,100,1000", help="rozmiary listy pracowników, po przecinku")
+    ap.add_argument("--sensors", type=int, default=2, help="sensorów na pracownika (gniazdko, termometr, reszta 'inny')")
+    ap.add_argument("--extra", type=int, default=500, help="dodatkowe, nieprzypisane encje w stubie")
+    ap.add_argument("--ticks", type=int, default=20, help="mierzone ticki (po jednym ticku startowym)")
+    ap.add_argument("--tick-gap", type=float, default=0.5, help="przerwa między tickami (s)")
+    ap.add_argument("--interval", type=float, default=0.5, help="co ile sekund stub zmienia stany gniazdek")
+    ap.add_argument("--churn", type=int, default=5, help="procent gniazdek zmienianych co --interval")
+    ap.add_argument("--latency", type=float, default=0.0, help="sztuczne opóźnienie odpowiedzi REST stubu (s)")
+    ap.add_argument("--engine", choices=("thread", "asyncio"), default="thread")
+    ap.add_argument("--no-websocket", action="store_true", help="bez WebSocketu (tryb awaryjny REST)")
+    ap.add_argument("--web-requests", type=int, default=50, help="zapytań do /api/monitor i / na scenariusz")
+    ap.add_argument("-o", "--output", help="plik wynikowy JSON (domyślnie stdout)")
+    ap.add_argument("--verbose", action="store_true", help="pokaż logi dodatku i stubu")
+    ap.add_argument("--scenario", type=int, help=argparse.SUPPRESS)
+    ap.add_argument("--result-file", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.scenario is not None:
+        with open(args.result_file, "w") as f: json.dump(run_scenario(args), f)
+        return
+
+    results = []
+    for employees in (int(n) for n in args.employees.split(",") if n.strip()):
+        print(f"[bench] {employees} pracowników x {args.sensors} sensorów...", file=sys.stderr, flush=True)
+        results.append(bench(args, employees))
+    report = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": sys.version.split()[0],
+              "argv": sys.argv[1:], "results": results}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w") as f: f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
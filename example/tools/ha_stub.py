@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# --- LOKALNY STUB HOME ASSISTANT (REST + WEBSOCKET) ---
+# Pozwala uruchomić employee_logic.py bez prawdziwego HA:
+#
+#   python3 tools/ha_stub.py --port 8123 --employees 5
+#   HA_API_URL=http://127.0.0.1:8123/api python3 employee_logic.py
+#
+# Obsługuje /api/, /api/states, /api/states/<id> (GET/POST/DELETE),
+# /api/lovelace/resources oraz /api/websocket (auth, subscribe_events, ping).
+# Wątek symulacji co --interval sekund zmienia moc losowych gniazdek.
+import argparse
+import base64
+import hashlib
+import json
+import random
+import struct
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WS_MAGIC = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+STATES = {}
+RESOURCES = []
+LOCK = threading.Lock()
+CLIENTS = []  # (socket, lock, zbiór id subskrypcji)
+
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+
+def put_state(entity_id, state, attributes):
+    with LOCK:
+        old = STATES.get(entity_id)
+        ts = now_iso()
+        changed = not old or old["state"] != str(state)
+        new = {
+            "entity_id": entity_id, "state": str(state), "attributes": attributes or {},
+            "last_changed": ts if changed else old["last_changed"], "last_updated": ts,
+        }
+        STATES[entity_id] = new
+    broadcast(entity_id, old, new)
+    return new, old is None
+
+
+def remove_state(entity_id):
+    with LOCK: old = STATES.pop(entity_id, None)
+    if old: broadcast(entity_id, old, None)
+    return old is not None
+
+
+# --- RAMKI WEBSOCKET (RFC 6455, tylko to czego używa klient) ---
+def ws_send(sock, lock, text):
+    data = text.encode()
+    header = bytearray([0x81])
+    if len(data) < 126: header.append(len(data))
+    elif len(data) < 65536: header += bytes([126]) + struct.pack("!H", len(data))
+    else: header += bytes([127]) + struct.pack("!Q", len(data))
+    with lock: sock.sendall(bytes(header) + data)
+
+
+def recv_exact(sock, n):
+    buf = b""
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk: raise ConnectionError("closed")
+        buf += chunk
+    return buf
+
+
+def ws_recv(sock):
+    b1, b2 = recv_exact(sock, 2)
+    opcode, length = b1 & 0x0F, b2 & 0x7F
+    if length == 126: length = struct.unpack("!H", recv_exact(sock, 2))[0]
+    elif length == 127: length = struct.unpack("!Q", recv_exact(sock, 8))[0]
+    mask = recv_exact(sock, 4) if b2 & 0x80 else b"\0\0\0\0"
+    payload = bytes(c ^ mask[i % 4] for i, c in enumerate(recv_exact(sock, length)))
+    return opcode, payload
+
+
+def broadcast(entity_id, old, new):
+    for sock, lock, subs in list(CLIENTS):
+        for sub_id in list(subs):
+            event = {"id": sub_id, "type": "event", "event": {
+                "event_type": "state_changed", "time_fired": now_iso(),
+                "data": {"entity_id": entity_id, "old_state": old, "new_state": new}}}
+            try: ws_send(sock, lock, json.dumps(event))
+            except OSError: pass
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def log_message(self, fmt, *args): pass
+
+    def _json(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path in ("/api/websocket", "/core/websocket") and self.headers.get("Upgrade", "").lower() == "websocket":
+            return self._websocket()
+        time.sleep(self.latency)
+        path = self.path.split("?")[0].replace("/core/api", "/api")
+        if path in ("/api", "/api/"): return self._json(200, {"message": "API running."})
+        if path == "/api/states":
+            with LOCK: return self._json(200, list(STATES.values()))
+        if path.startswith("/api/states/"):
+            with LOCK: st = STATES.get(path[len("/api/states/"):])
+            return self._json(200, st) if st else self._json(404, {"message": "Entity not found."})
+        if path == "/api/lovelace/resources": return self._json(200, RESOURCES)
+        self._json(404, {"message": "Not found"})
+
+    def do_POST(self):
+        time.sleep(self.latency)
+        path = self.path.replace("/core/api", "/api")
+        if path.startswith("/api/states/"):
+            body = self._body()
+            st, created = put_state(path[len("/api/states/"):], body.get("state"), body.get("attributes"))
+            return self._json(201 if created else 200, st)
+        if path == "/api/lovelace/resources":
+            res = dict(self._body(), id=str(len(RESOURCES) + 1))
+            RESOURCES.append(res)
+            return self._json(201, res)
+        self._json(404, {"message": "Not found"})
+
+    def do_DELETE(self):
+        time.sleep(self.latency)
+        path = self.path.replace("/core/api", "/api")
+        if path.startswith("/api/states/") and remove_state(path[len("/api/states/"):]):
+            return self._json(200, {"message": "Entity removed."})
+        self._json(404, {"message": "Entity not found."})
+
+    def _websocket(self):
+        accept = base64.b64encode(hashlib.sha1((self.headers["Sec-WebSocket-Key"] + WS_MAGIC).encode()).digest()).decode()
+        self.send_response(101, "Switching Protocols")
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.wfile.flush()
+
+        sock, lock, subs = self.connection, threading.Lock(), set()
+        sock.settimeout(None)
+        ws_send(sock, lock, json.dumps({"type": "auth_required", "ha_version": "stub"}))
+        authed = False
+        try:
+            while True:
+                opcode, payload = ws_recv(sock)
+                if opcode == 0x8: break
+                if opcode == 0x9:
+                    with lock: sock.sendall(bytes([0x8A, len(payload)]) + payload)
+                    continue
+                msg = json.loads(payload)
+                if not authed:
+                    if msg.get("type") != "auth": break
+                    authed = True
+                    ws_send(sock, lock, json.dumps({"type": "auth_ok", "ha_version": "stub"}))
+                    CLIENTS.append((sock, lock, subs))
+                    continue
+                if msg.get("type") == "subscribe_events":
+                    if msg.get("event_type") == "state_changed": subs.add(msg["id"])
+                    ws_send(sock, lock, json.dumps({"id": msg["id"], "type": "result", "success": True, "result": None}))
+                elif msg.get("type") == "ping":
+                    ws_send(sock, lock, json.dumps({"id": msg["id"], "type": "pong"}))
+                else:
+                    ws_send(sock, lock, json.dumps({"id": msg.get("id"), "type": "result", "success": True, "result": None}))
+        except (ConnectionError, OSError, ValueError):
+            pass
+        finally:
+            if (sock, lock, subs) in CLIENTS: CLIENTS.remove((sock, lock, subs))
+            self.close_connection = True
+
+
+def seed(employees, extra):
+    for i in range(employees):
+        put_state(f"sensor.gniazdko_{i}_power", round(random.uniform(0, 80), 1),
+                  {"unit_of_measurement": "W", "device_class": "power", "friendly_name": f"Gniazdko {i} Moc"})
+        put_state(f"sensor.czujnik_{i}_temperature", round(random.uniform(19, 25), 1),
+                  {"unit_of_measurement": "°C", "device_class": "temperature", "friendly_name": f"Czujnik {i} Temperatura"})
+    for i in range(extra):
+        put_state(f"sensor.inny_{i}", random.randint(0, 100), {"friendly_name": f"Inny {i}"})
+
+
+def simulate(employees, interval, changes=1):
+    while True:
+        time.sleep(interval)
+        if not employees: continue
+        for i in random.sample(range(employees), min(changes, employees)):
+            put_state(f"sensor.gniazdko_{i}_power", round(random.uniform(0, 80), 1),
+                      {"unit_of_measurement": "W", "device_class": "power", "friendly_name": f"Gniazdko {i} Moc"})
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Stub API Home Assistant do testów offline")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8123)
+    ap.add_argument("--employees", type=int, default=5, help="liczba par gniazdko+termometr")
+    ap.add_argument("--extra", type=int, default=50, help="dodatkowe, nieprzypisane encje")
+    ap.add_argument("--interval", type=float, default=2.0, help="co ile sekund zmienia się losowe gniazdko")
+    ap.add_argument("--changes", type=int, default=1, help="ile gniazdek zmienia się co --interval")
+    ap.add_argument("--latency", type=float, default=0.0, help="sztuczne opóźnienie odpowiedzi REST (s)")
+    args = ap.parse_args()
+
+    Handler.latency = args.latency
+    seed(args.employees, args.extra)
+    threading.Thread(target=simulate, args=(args.employees, args.interval, args.changes), daemon=True).start()
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f"Stub HA: http://{args.host}:{args.port}/api (WebSocket: ws://{args.host}:{args.port}/api/websocket)", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
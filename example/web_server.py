@@ -1,18 +1,25 @@
 import json
 import os
-import requests
-import csv
-import io
-import sqlite3
-import shutil
-from datetime import datetime
-from flask import Flask, request, jsonify, render_template, Response, send_file
+import queue
+import time
+from flask import Flask, request, jsonify, render_template, Response, make_response, send_file, stream_with_context
+import http_cache
+import metrics
+from addon_options import DATA_DIR
+from card_install import card_resource_url, register_card_resource, sync_card_file
+from ha_client import HA
+from employee_registry import EmployeeRegistry
+from managed_entities import ManagedEntities
+from history_store import attachment_header, build_export, query_reports, query_stats
+from monitor_snapshot import SnapshotBroadcaster, SnapshotReader
+from profiling import PROFILES, instrument_flask
+from sensor_catalog import SensorCatalog
+from series_store import query_series
 
 # --- KONFIGURACJA ŚCIEŻEK ---
-DATA_FILE = "/data/employees.json"
-OPTIONS_FILE = "/data/options.json"
-DB_FILE = "/data/employee_history.db"
-HISTORY_FILE = "/data/history.json"
+DATA_FILE = os.path.join(DATA_DIR, "employees.json")
+DB_FILE = os.path.join(DATA_DIR, "employee_history.db")
+MANAGED_FILE = os.path.join(DATA_DIR, "managed_entities.json")
 
 # Ścieżki do instalacji kart
 SOURCE_JS_FILE = "/app/employee-card.js"
@@ -20,131 +27,49 @@ HA_WWW_DIR = "/config/www"
 DEST_JS_FILE = os.path.join(HA_WWW_DIR, "employee-card.js")
 CARD_URL_RESOURCE = "/local/employee-card.js"
 
-SUPERVISOR_TOKEN = os.environ.get("SUPERVISOR_TOKEN")
-TOKEN = ""
-API_URL = ""
-
-if SUPERVISOR_TOKEN:
-    TOKEN = SUPERVISOR_TOKEN
-    API_URL = "http://supervisor/core/api"
-    # Zmieniona informacja w logu, żeby widzieć skąd startujemy
-    print(">>> [API] Używam Supervizora (Adres: supervisor/core/api)", flush=True)
-else:
-    # Ten blok jest tylko awaryjny (jeśli w ogóle nie ma Supervisora)
-    print(">>> [API] OSTRZEŻENIE: Brak Supervizora - Fallback na plik opcji.", flush=True)
-    try:
-        if os.path.exists(OPTIONS_FILE):
-            with open(OPTIONS_FILE, 'r') as f:
-                opts = json.load(f)
-                TOKEN = opts.get("ha_token", "").strip()
-    except: pass
-    
-    # Używamy adresu wewnętrznego HA, ale on jest zawodny bez Supervizora
-    API_URL = "http://homeassistant:8123/api"
-    
-if not TOKEN:
-    print("!!! [API] Błąd: Brak tokena do komunikacji z HA.", flush=True)
-    
-HEADERS = {
-    "Authorization": f"Bearer {TOKEN}",
-    "Content-Type": "application/json",
-}
+PAGE_BUDGET = 5  # sekundy: łączny limit na zapytania do HA przy obsłudze jednego żądania
 
 app = Flask(__name__)
+metrics.instrument_flask(app)
+instrument_flask(app, PROFILES)
+http_cache.instrument_flask(app)  # po metrykach: after_request działa w odwrotnej kolejności, metryki widzą 304
 
 # --- LISTY I SŁOWNIKI POMOCNICZE ---
 SUFFIXES_TO_CLEAN = [
-    "_status", "_czas_pracy", 
+    "_status", "_czas_pracy", "_czas_tydzien",
     "_temperatura", "_wilgotnosc", "_cisnienie", 
     "_moc", "_napiecie", "_natezenie", 
     "_bateria", "_pm25", "_jasnosc"
 ]
 
-GLOBAL_BLACKLIST = [
-    "indicator", "light", "led", "display", "lock", "child", "physical control",     
-    "filter", "life", "used time", "alarm", "error", "fault", "problem",     
-    "update", "install", "version", "identify", "zidentyfikuj", "info",
-    "iphone", "ipad", "phone", "mobile", "router", "gateway", "brama"      
-]
-
-PRETTY_NAMES = {
-    "temperature": "Temperatura", "humidity": "Wilgotność", "pressure": "Ciśnienie",
-    "power": "Moc", "energy": "Energia", "voltage": "Napięcie", "current": "Natężenie",
-    "battery": "Bateria", "signal_strength": "Sygnał", "pm25": "PM 2.5", "illuminance": "Jasność",
-    "connectivity": "Połączenie"
-}
-
-BLOCKED_PREFIXES = ["sensor.backup_", "sensor.sun_", "sensor.date", "sensor.time", "sensor.zone", "sensor.automation", "sensor.script", "update.", "person.", "zone.", "sun.", "todo.", "button.", "input_"]
-BLOCKED_DEVICE_CLASSES = ["timestamp", "enum", "update", "date", "identify"]
+REGISTRY = EmployeeRegistry(DATA_FILE)
+MANAGED = ManagedEntities(MANAGED_FILE)
+MONITOR = SnapshotReader()
+BROADCAST = SnapshotBroadcaster(MONITOR)
+SSE_HEARTBEAT = 15      # komentarz ": ping" co tyle sekund (utrzymuje połączenie przez proxy ingress)
+SSE_MAX_AGE = 600       # po tylu sekundach zamykamy strumień; EventSource sam się połączy ponownie
+# Worker z jednym wątkiem ("sync" albo gthread z web_threads: 1) obsługuje jedno żądanie naraz -
+# otwarty strumień zablokowałby go na SSE_MAX_AGE. run.sh ustawia WEB_THREADS=1 dla "sync".
+SSE_ENABLED = os.environ.get("WEB_WORKER_CLASS", "gthread") != "sync" and int(os.environ.get("WEB_THREADS", "32")) > 1
 
 # --- FUNKCJE POMOCNICZE ---
-def load_json(file_path):
-    if not os.path.exists(file_path):
-        return []
-    try:
-        with open(file_path, 'r') as f: return json.load(f)
-    except: return []
-
-def save_json(file_path, data):
-    with open(file_path, 'w') as f: json.dump(data, f, indent=4)
 
 def delete_ha_state(entity_id):
-    try:
-        requests.delete(f"{API_URL}/states/{entity_id}", headers=HEADERS)
-    except: pass
+    # True - encji nie ma już w HA (także 404); False - zostaje w rejestrze do ponowienia przez logikę
+    try: r = HA.request("DELETE", f"/states/{entity_id}")
+    except Exception: return False
+    return r.status_code in (200, 404)
 
-def get_ha_state(entity_id):
+def fetch_all_states():
     try:
-        resp = requests.get(f"{API_URL}/states/{entity_id}", headers=HEADERS)
-        if resp.status_code == 200:
-            state = resp.json().get("state")
-            try: return str(round(float(state), 1))
-            except: return state
-    except: pass
-    return "-"
-
-def get_clean_sensors():
-    sensors = []
-    try:
-        resp = requests.get(f"{API_URL}/states", headers=HEADERS)
-        if resp.status_code == 200:
-            all_states = resp.json()
-            for entity in all_states:
-                eid = entity['entity_id']
-                attrs = entity.get("attributes", {})
-                friendly_name = attrs.get("friendly_name", eid).lower()
-                device_class = attrs.get("device_class")
-                
-                if not (eid.startswith(("sensor.", "binary_sensor.", "switch.", "light."))): continue
-                if attrs.get("managed_by") == "employee_manager": continue
-                if eid.endswith("_status") or eid.endswith("_czas_pracy"): continue
-                if any(bad_word in friendly_name for bad_word in GLOBAL_BLACKLIST): continue
-                if any(eid.startswith(p) for p in BLOCKED_PREFIXES): continue
-                if device_class in BLOCKED_DEVICE_CLASSES: continue
-                if " - " in friendly_name and "status" in friendly_name: continue 
-
-                unit = attrs.get("unit_of_measurement", "")
-                orig_friendly_name = attrs.get("friendly_name", eid)
-                main_label = orig_friendly_name
-                
-                if device_class in PRETTY_NAMES: main_label = PRETTY_NAMES[device_class]
-                elif unit == "W": main_label = "Moc"
-                elif unit == "V": main_label = "Napięcie"
-                elif unit == "kWh": main_label = "Energia"
-                elif unit == "%": main_label = "Wilgotność"
-                
-                sensors.append({
-                    "id": eid, 
-                    "main_label": main_label, 
-                    "sub_label": orig_friendly_name,
-                    "unit": unit, 
-                    "state": entity.get("state", "-"), 
-                    "device_class": device_class
-                })
-            sensors.sort(key=lambda x: (x['main_label'], x['sub_label']))
+        resp = HA.request("GET", "/states", timeout=10)
+        if resp.status_code == 200: return resp.json()
+        print(f"Błąd API: /states zwróciło {resp.status_code}", flush=True)
     except Exception as e:
         print(f"Błąd API: {e}", flush=True)
-    return sensors
+    return None
+
+CATALOG = SensorCatalog(fetch_all_states)
 
 def install_and_register_card():
     # 1. Ścieżki
@@ -162,78 +87,143 @@ def install_and_register_card():
         if not os.path.exists(SOURCE):
              return False, "Błąd: Plik źródłowy employee-card.js nie istnieje w /app"
 
-        shutil.copy2(SOURCE, DEST_FILE)
-        print(f">>> SKOPIOWANO: {SOURCE} -> {DEST_FILE}", flush=True)
+        # Kopiujemy tylko inną treść (sha256) - ponowne kliknięcie nie przepisuje pliku
+        if sync_card_file(SOURCE, DEST_FILE):
+            print(f">>> SKOPIOWANO: {SOURCE} -> {DEST_FILE}", flush=True)
     except Exception as e:
         return False, f"Błąd kopiowania pliku: {str(e)}"
 
-    # 3. Rejestracja w API
-    api_url = f"{API_URL}/lovelace/resources"
+    # 3. Rejestracja w API - adres z odciskiem treści (?v=), stary wpis karty dostaje nowy adres
     try:
-        get_res = requests.get(api_url, headers=HEADERS)
-        if get_res.status_code == 200:
-            resources = get_res.json()
-            for res in resources:
-                if res['url'] == RESOURCE_URL:
-                    return True, "Karta zaktualizowana!"
-        
-        payload = {"type": "module", "url": RESOURCE_URL}
-        post_res = requests.post(api_url, headers=HEADERS, json=payload)
-        
-        if post_res.status_code in [200, 201]:
-            return True, "Karta zarejestrowana pomyślnie!"
-        else:
-            return False, f"Błąd API HA ({post_res.status_code})"
+        status = register_card_resource(HA, card_resource_url(RESOURCE_URL, SOURCE))
     except Exception as e:
         return False, f"Błąd API: {str(e)}"
+    if status == "exists": return True, "Karta zaktualizowana!"
+    if status == "updated": return True, "Zarejestrowano nową wersję karty!"
+    return True, "Karta zarejestrowana pomyślnie!"
 
 # --- ENDPOINTY FLASK ---
 @app.route('/')
 def index():
-    return render_template('index.html', all_sensors=get_clean_sensors())
+    t0 = time.perf_counter()
+    with HA.budget(PAGE_BUDGET):
+        all_sensors, hit = CATALOG.get()
+    t1 = time.perf_counter()
+    resp = make_response(render_template('index.html', all_sensors=all_sensors))
+    t2 = time.perf_counter()
+    source = "hit" if hit else "miss"
+    resp.headers["X-Sensor-Catalog"] = source
+    resp.headers["Server-Timing"] = f'catalog;desc="{source}";dur={(t1 - t0) * 1000:.1f}, render;dur={(t2 - t1) * 1000:.1f}'
+    return resp
+
+EMPLOYEES_JSON = http_cache.VersionedJson()  # lista serializowana raz na wersję rejestru
 
 @app.route('/api/employees', methods=['GET'])
-def api_get(): return jsonify(load_json(DATA_FILE))
+def api_get(): return EMPLOYEES_JSON.response(*REGISTRY.snapshot())
 
 @app.route('/api/employees', methods=['POST'])
 def api_post():
     data = request.json
-    emps = load_json(DATA_FILE)
-    emps = [e for e in emps if e['name'] != data['name']]
     # Usuwamy grupę jeśli przyszła
     if 'group' in data: del data['group']
-    emps.append(data)
-    save_json(DATA_FILE, emps)
+    REGISTRY.upsert(data)
     return jsonify({"status":"ok"})
 
-@app.route('/api/employees/<int:i>', methods=['DELETE'])
-def api_del(i):
-    emps = load_json(DATA_FILE)
-    if 0 <= i < len(emps):
-        to_delete = emps[i]
-        safe_name = to_delete['name'].lower().replace(" ", "_")
-        delete_ha_state(f"sensor.{safe_name}_status")
-        delete_ha_state(f"sensor.{safe_name}_czas_pracy")
-        for suffix in SUFFIXES_TO_CLEAN:
-            delete_ha_state(f"sensor.{safe_name}{suffix}")
-        del emps[i]
-        save_json(DATA_FILE, emps)
+@app.route('/api/employees/<path:name>', methods=['DELETE'])
+def api_del(name):
+    # Usuwanie po imieniu, nie po pozycji na liście - dwa otwarte panele nie skasują złej osoby
+    to_delete = REGISTRY.delete(name)
+    if to_delete is None: return jsonify({"status": "not_found"}), 404
+    # Encje z rejestru dodatku; bez wpisu (stara instalacja) zgadujemy po suffixach
+    entity_ids = MANAGED.remove_employee(to_delete['name'].strip())
+    if not entity_ids:
+        safe_name = to_delete['name'].strip().lower().replace(" ", "_")
+        entity_ids = {f"sensor.{safe_name}{suffix}" for suffix in SUFFIXES_TO_CLEAN}
+    with HA.budget(PAGE_BUDGET):
+        failed = {eid for eid in sorted(entity_ids) if not delete_ha_state(eid)}
+    MANAGED.defer(failed)
     return jsonify({"status":"ok"})
 
 @app.route('/api/monitor', methods=['GET'])
 def api_monitor():
-    emps = load_json(DATA_FILE)
-    res = []
-    for emp in emps:
-        safe = emp['name'].lower().replace(" ","_")
-        status = get_ha_state(f"sensor.{safe}_status") or "N/A"
-        time = get_ha_state(f"sensor.{safe}_czas_pracy") or "0"
-        meas = []
-        for entity_id in emp.get('sensors', []):
-            val = get_ha_state(entity_id)
-            meas.append({"label": entity_id, "value": val, "unit": ""}) 
-        res.append({"name": emp['name'], "status": status, "work_time": time, "measurements": meas})
-    return jsonify(res)
+    # Gotowy wynik ostatniego ticku z procesu logiki - zero zapytań do HA.
+    # Zaraz po restarcie: kopia z /data (X-Monitor-Restored: 1) do pierwszego nowego ticku.
+    snap = MONITOR.refresh()
+    return Response(snap.employees_json, mimetype="application/json",
+                    headers={"X-Monitor-Version": str(snap.version), "X-Monitor-Restored": "1" if snap.restored else "0"})
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, separators=(',', ':'))}\n\n"
+
+@app.route('/api/stream')
+def api_stream():
+    # Server-Sent Events: pełny snapshot po połączeniu, potem tylko różnice per pracownik.
+    # Każdy klient trzyma jeden wątek workera (gthread), diff liczony jest raz w BROADCAST.
+    # 204 zamyka EventSource bez ponawiania - panel przechodzi na odpytywanie /api/monitor.
+    if not SSE_ENABLED: return "", 204
+    q = BROADCAST.subscribe()
+
+    def generate():
+        try:
+            snap = MONITOR.refresh()
+            yield "retry: 3000\n"
+            yield _sse("snapshot", {"version": snap.version, "employees": snap.employees})
+            end = time.monotonic() + SSE_MAX_AGE
+            while time.monotonic() < end:
+                try: msg = q.get(timeout=SSE_HEARTBEAT)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if msg.get("resync"):
+                    snap = MONITOR.refresh()
+                    yield _sse("snapshot", {"version": snap.version, "employees": snap.employees})
+                else:
+                    yield _sse("diff", msg)
+        finally:
+            BROADCAST.unsubscribe(q)
+
+    return Response(stream_with_context(generate()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.route('/metrics')
+def api_metrics():
+    # Metryki obu procesów (logika + gunicorn) z plików trybu wieloprocesowego
+    body, status = metrics.render()
+    return Response(body, status=status, content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/profiles', methods=['GET'])
+def api_profiles():
+    return jsonify({"pending": PROFILES.pending(), "files": PROFILES.files()})
+
+@app.route('/api/profiles', methods=['POST'])
+def api_profiles_request():
+    # {"target": "tick", "count": 5} albo {"target": "route", "route": "/api/monitor", "count": 20}
+    data = request.get_json(silent=True) or {}
+    try: count = int(data.get("count", 1))
+    except (TypeError, ValueError): return jsonify({"error": "count musi być liczbą"}), 400
+    if count < 1: return jsonify({"error": "count musi być dodatni"}), 400
+    if data.get("target") == "tick":
+        target = "tick"
+    elif data.get("target") == "route":
+        rules = {r.rule for r in app.url_map.iter_rules()}
+        if data.get("route") not in rules: return jsonify({"error": "nieznana trasa", "routes": sorted(rules)}), 400
+        target = f"route:{data['route']}"
+    else:
+        return jsonify({"error": "target: tick albo route"}), 400
+    return jsonify({"status": "ok", "pending": PROFILES.request(target, count)})
+
+@app.route('/api/profiles/<name>', methods=['GET'])
+def api_profile_file(name):
+    path = PROFILES.path_for(name)
+    if path is None: return "Not found", 404
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True, download_name=name)
+
+@app.route('/download_report')
+def download_report():
+    # ?from=&to=&employee=&mode=daily|monthly&format=csv|xlsx - wiersze strumieniowane prosto z bazy
+    try: chunks, mimetype, filename = build_export(DB_FILE, request.args)
+    except ValueError as e: return str(e), 400
+    return Response(stream_with_context(chunks), mimetype=mimetype, headers={"Content-Disposition": attachment_header(filename)})
 
 @app.route('/api/install_card', methods=['POST'])
 def api_install_card():
@@ -245,7 +235,30 @@ def api_install_card():
 
 @app.route('/api/history', methods=['GET'])
 def api_history():
-    return jsonify(load_json(HISTORY_FILE))
+    # ?from=RRRR-MM-DD&to=RRRR-MM-DD&employee=<imię>&limit=30&cursor=<next_cursor z poprzedniej strony>
+    a = request.args
+    try:
+        page = query_reports(DB_FILE, a.get('from'), a.get('to'), a.get('employee'), a.get('limit', 30), a.get('cursor'))
+    except ValueError: return jsonify({"error": "Nieprawidłowy parametr limit"}), 400
+    return jsonify(page)
+
+@app.route('/api/stats', methods=['GET'])
+def api_stats():
+    # Sumy okresowe z tabeli work_rollups (bez przeliczania dziennych wierszy):
+    # ?period=week|month|year&from=RRRR-MM-DD&to=RRRR-MM-DD&employee=<imię>&limit=12
+    a = request.args
+    try:
+        stats = query_stats(DB_FILE, a.get('period', 'week'), a.get('from'), a.get('to'), a.get('employee'), a.get('limit', 12))
+    except ValueError as e: return jsonify({"error": str(e)}), 400
+    return jsonify(stats)
+
+@app.route('/api/series/<path:name>', methods=['GET'])
+def api_series(name):
+    # Szeregi kopii sensorów pracownika do wykresów: ?range=1h|24h|30d&points=<maks. liczba punktów>
+    a = request.args
+    try: series = query_series(DB_FILE, name, a.get('range', '24h'), a.get('points'))
+    except ValueError as e: return jsonify({"error": str(e)}), 400
+    return jsonify(series)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file